@@ -0,0 +1,88 @@
+"""
+Асинхронные обработчики чтения для запуска под ASGI.
+
+В Django 3.2 нет асинхронного ORM, поэтому view DRF целиком — запросы,
+сериализация и рендеринг — выполняется в пуле из ASYNC_READ_WORKERS
+потоков, а цикл событий тем временем обслуживает остальные соединения.
+Пул ограничивает число соединений с базой, занятых чтением; соединения
+потоков пула живут по правилам CONN_MAX_AGE. Запись идет обычным путем
+Django для синхронных view.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from api.middleware import view_finished
+from api.permissions import SAFE_METHODS
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+ASYNC_READ_WORKERS = getattr(settings, "ASYNC_READ_WORKERS", 8)
+
+# Имена маршрутов роутера, чтение которых обслуживается асинхронно.
+ASYNC_READ_ROUTES = (
+    "recipe-list",
+    "recipe-detail",
+    "tag-list",
+    "tag-detail",
+    "ingredient-list",
+    "ingredient-detail",
+    "users-subscriptions",
+)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=ASYNC_READ_WORKERS, thread_name_prefix="async-read")
+    return _executor
+
+
+def read(view, request, *args, **kwargs):
+    """Выполняет view и рендерит ответ в потоке пула."""
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render"):
+            view_finished(request, response)
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """Асинхронная версия view: чтение в пуле потоков, запись как прежде."""
+    sync_view = sync_to_async(view)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await sync_view(request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_executor(),
+            partial(context.run, read, view, request, *args, **kwargs),
+        )
+
+    return wrapper
+
+
+def async_read_urls(patterns):
+    """Маршруты, в которых view из ASYNC_READ_ROUTES заменены асинхронными."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_read_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if pattern.name in ASYNC_READ_ROUTES else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,99 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from api.cache import get_version
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+AUTH_TOKEN_CACHE_SIZE = getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 10000)
+AUTH_TOKEN_CACHE_TIMEOUT = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+
+
+class TokenCache:
+    """
+    Токены и их пользователи в памяти процесса: LRU с временем жизни.
+
+    Каждая запись хранит счетчик пользователя из общего кэша (auth_scope)
+    на момент чтения из базы. Выход, смена пароля и деактивация
+    увеличивают счетчик, и записи этого пользователя перестают
+    приниматься во всех процессах.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1], entry[2], entry[3]
+
+    def set(self, key, user, token, version):
+        with self.lock:
+            self.entries[key] = (
+                time.monotonic() + self.timeout, user, token, version)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_user(self, user_id):
+        with self.lock:
+            for key in [
+                key for key, (_, user, _, _) in self.entries.items()
+                if user.pk == user_id
+            ]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TIMEOUT)
+
+
+def auth_scope(user_id):
+    """Счетчик изменений пользователя, отзывающих его токены."""
+    return f"auth:{user_id}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без SQL-запроса для уже встречавшихся токенов.
+
+    Запись из памяти принимается, только если счетчик пользователя в
+    общем кэше не изменился; без счетчика (DummyCache) токен всегда
+    проверяется по базе. Каждый запрос получает копии пользователя
+    и токена, чтобы изменения одного запроса не попадали в другие.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is not None:
+            version = get_version(auth_scope(entry[0].pk))
+            if version is None or version != entry[2]:
+                entry = None
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            version = get_version(auth_scope(user.pk))
+            if version is not None:
+                token_cache.set(key, user, token, version)
+            entry = user, token
+        user = copy.copy(entry[0])
+        token = copy.copy(entry[1])
+        token.user = user
+        return user, token
@@ -0,0 +1,227 @@
+"""
+Нагрузочный прогон API по запросам из postman-collection.
+
+Запросы коллекции берутся по имени, переменные {{...}} подставляются
+из словаря пользователя-воркера. Сценарии — цепочки таких запросов
+с весами, воркеры выполняют их параллельно заданное время.
+"""
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.db import connections
+
+VARIABLE = re.compile(r"{{(\w+)}}")
+QUERY_COUNT_HEADER = "X-Query-Count"
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+# Имя сценария: (вес, шаги). Шаг — имя запроса коллекции и,
+# при необходимости, переменная, в которую сохраняется id из ответа.
+SCENARIOS = {
+    "feed": (50, (
+        ("get_recipes_list // No Auth", None),
+        ("get_recipes_list // User", None),
+        ("get_recipes_list_with_two_tags_param // User", None),
+        ("get_recipe_detail // User", None),
+    )),
+    "search_ingredients": (20, (
+        ("get_ingredients_list_with_name_filter // User", None),
+    )),
+    "favorite": (15, (
+        ("add_to_favorite // User", None),
+        ("get_recipes_list_with_is_favorited_cart_param // User", None),
+        ("remove_from_favorite // User", None),
+    )),
+    "cart_download": (10, (
+        ("add_to_shopping_cart // User", None),
+        ("download_shopping_cart // User", None),
+        ("remove_from_shopping_cart // User", None),
+    )),
+    "create_recipe": (5, (
+        ("create_first_recipe // Second User", "fifthRecipeId"),
+        ("delete_fifth_recipe // Second User", None),
+    )),
+}
+
+
+class Collection:
+    """Запросы postman-коллекции по имени."""
+
+    def __init__(self, path):
+        with open(path, encoding="utf-8") as source:
+            data = json.load(source)
+        self.variables = {
+            item["key"]: item["value"] for item in data.get("variable", ())
+        }
+        self.requests = {}
+        self.collect(data["item"], data.get("auth"))
+
+    def collect(self, items, auth):
+        for item in items:
+            if "item" in item:
+                self.collect(item["item"], item.get("auth", auth))
+                continue
+            request = item["request"]
+            url = request["url"]
+            self.requests.setdefault(item["name"].strip(), {
+                "method": request["method"],
+                "url": url["raw"] if isinstance(url, dict) else url,
+                "body": request.get("body", {}).get("raw"),
+                "auth": request.get("auth", auth),
+            })
+
+    def build(self, name, variables):
+        """Метод, url, тело и заголовки запроса с подставленными значениями."""
+        request = self.requests[name]
+
+        def render(template, quote=str):
+            return VARIABLE.sub(
+                lambda match: quote(str(variables[match.group(1)])), template)
+
+        def quote_url(value):
+            return urllib.parse.quote(value, safe=":/")
+
+        headers = {}
+        auth = request["auth"] or {}
+        if auth.get("type") == "apikey":
+            fields = {field["key"]: field["value"] for field in auth["apikey"]}
+            headers[fields["key"]] = render(fields["value"])
+        body = None
+        if request["body"]:
+            body = render(request["body"]).encode()
+            headers["Content-Type"] = "application/json"
+        url = render(request["url"], quote_url)
+        return request["method"], url, body, headers
+
+
+class QueryCountingApp:
+    """WSGI-обертка: число SQL-запросов запроса в заголовке ответа."""
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        def counting_start_response(status, headers, exc_info=None):
+            headers.append((QUERY_COUNT_HEADER, str(len(queries))))
+            return start_response(status, headers, exc_info)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            return self.application(environ, counting_start_response)
+
+
+def query_count(headers):
+    """Число SQL из заголовка обертки или из Server-Timing сервера."""
+    count = headers.get(QUERY_COUNT_HEADER)
+    if count is None:
+        match = SERVER_TIMING_QUERIES.search(headers.get("Server-Timing", ""))
+        count = match.group(1) if match else None
+    return count
+
+
+def send(collection, name, variables):
+    """Выполняет запрос коллекции. Возвращает статус, тело и число SQL."""
+    method, url, body, headers = collection.build(name, variables)
+    request = urllib.request.Request(
+        url, data=body, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return (response.status, response.read(),
+                    query_count(response.headers))
+    except urllib.error.HTTPError as error:
+        return error.code, error.read(), query_count(error.headers)
+    except OSError as error:
+        return 0, str(error).encode(), None
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(0, int(round(share * len(ordered))) - 1)]
+
+
+class Benchmark:
+    """Параллельный прогон взвешенных сценариев."""
+
+    def __init__(self, collection, workers, recipe_ids, scenarios=SCENARIOS):
+        self.collection = collection
+        self.workers = workers
+        self.recipe_ids = recipe_ids
+        self.scenarios = scenarios
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, name, status, elapsed, queries):
+        endpoint = name.split(" // ")[0]
+        with self.lock:
+            self.samples[endpoint].append((status, elapsed, queries))
+
+    def run_worker(self, variables, deadline, seed):
+        generator = random.Random(seed)
+        names = list(self.scenarios)
+        weights = [self.scenarios[name][0] for name in names]
+        while time.monotonic() < deadline:
+            scenario = generator.choices(names, weights)[0]
+            variables = dict(
+                variables, firstRecipeId=generator.choice(self.recipe_ids))
+            for name, save_as in self.scenarios[scenario][1]:
+                started = time.perf_counter()
+                status, body, queries = send(self.collection, name, variables)
+                self.record(
+                    name, status, time.perf_counter() - started, queries)
+                if save_as and status < 300:
+                    variables[save_as] = json.loads(body)["id"]
+
+    def run(self, duration, seed=0):
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(
+                target=self.run_worker,
+                args=(variables, deadline, seed + number),
+            )
+            for number, variables in enumerate(self.workers)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.summary(time.monotonic() - started)
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            latencies = [sample[1] * 1000 for sample in samples]
+            queries = [int(sample[2]) for sample in samples if sample[2]]
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(
+                    1 for sample in samples if not 200 <= sample[0] < 400),
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "queries_per_request": (
+                    round(sum(queries) / len(queries), 2) if queries else None
+                ),
+            }
+        total = sum(item["requests"] for item in endpoints.values())
+        return {
+            "duration_s": round(elapsed, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+            "endpoints": endpoints,
+        }
@@ -0,0 +1,150 @@
+import hashlib
+import time
+
+from api.filters import RecipeFilter
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from recipes.models import Recipe
+from users.models import Subscription
+
+VERSION_KEY = "version:{}"
+# Параметры пагинации ленты; параметры фильтра берутся из RecipeFilter.
+RECIPE_PAGE_PARAMS = ("page", "limit", "cursor")
+# Фильтры по отметкам пользователя: такая лента не бывает общей.
+PERSONAL_FILTERS = ("is_favorited", "is_in_shopping_cart")
+RECIPE_LIST_CACHE_TIMEOUT = getattr(
+    settings, "RECIPE_LIST_CACHE_TIMEOUT", 10 * 60)
+
+
+def get_version(name):
+    """Счетчик изменений таблицы name."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Увеличивает счетчик изменений таблицы name."""
+    key = VERSION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_versions(names):
+    """Счетчики изменений для нескольких имен за одно обращение к кэшу."""
+    keys = [VERSION_KEY.format(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def recipe_scopes(tag_slugs=(), author_ids=()):
+    """Имена счетчиков для выборок рецептов по тэгам и авторам."""
+    return [
+        "recipes:tag:" + hashlib.md5(slug.encode()).hexdigest()
+        for slug in tag_slugs
+    ] + [f"recipes:author:{author_id}" for author_id in author_ids]
+
+
+def author_scope(author_id):
+    """Счетчик данных автора, которые входят в представление рецепта."""
+    return f"author:{author_id}"
+
+
+def bump_recipe_scopes(tag_slugs, author_ids):
+    """Сбрасывает кэш лент, в которые мог попасть измененный рецепт."""
+    for name in ["recipes"] + recipe_scopes(tag_slugs, author_ids):
+        bump_version(name)
+
+
+def recipe_list_cache_key(request):
+    """
+    Ключ кэша страницы ленты, общей для всех пользователей.
+    Учитывает нормализованные параметры запроса и счетчики тех тэгов
+    и авторов, по которым отфильтрована лента, либо общий счетчик.
+    Возвращает None, если страницу кэшировать нельзя.
+    """
+    params = request.query_params
+    if any(name in params for name in PERSONAL_FILTERS):
+        return None
+    author = params.get("author")
+    if author is not None and not author.isdigit():
+        return None
+    tags = sorted(set(params.getlist("tags")))
+    names = recipe_scopes(tags, [author] if author else ())
+    names = (names or ["recipes"]) + ["tag", "ingredient"]
+    normalized = [
+        (name, sorted(params.getlist(name)))
+        for name in sorted(
+            set(RecipeFilter.base_filters) | set(RECIPE_PAGE_PARAMS))
+        if name in params
+    ]
+    state = (request.get_host(), normalized, get_versions(names))
+    return "recipe-list:" + hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def version_etag(name):
+    """
+    ETag по счетчику изменений или None, если кэш счетчик не хранит:
+    постоянный ETag отвечал бы 304 и после изменения данных.
+    """
+    version = get_version(name)
+    if version is None:
+        return None
+    return f"{name}-{version}"
+
+
+def tag_etag(request, *args, **kwargs):
+    return version_etag("tag")
+
+
+def ingredient_etag(request, *args, **kwargs):
+    return version_etag("ingredient")
+
+
+def recipe_state(request, pk):
+    """
+    Все, от чего зависит ответ по рецепту, кроме тэгов и ингредиентов:
+    дата изменения, данные автора и отметки пользователя.
+    """
+    fields = [
+        "updated_at", "author__username", "author__email",
+        "author__first_name", "author__last_name",
+    ]
+    recipes = Recipe.objects.filter(pk=pk)
+    user = request.user
+    if user.is_authenticated:
+        recipes = recipes.with_user_flags(user).annotate(
+            author_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef("author_id")))
+        )
+        fields += ["is_favorited", "is_in_shopping_cart", "author_subscribed"]
+    return recipes.values_list(*fields).first()
+
+
+def recipe_etag(request, pk, *args, **kwargs):
+    state = recipe_state(request, pk)
+    if state is None:
+        return None
+    versions = get_versions(["tag", "ingredient"])
+    if None in versions:
+        return None
+    state += tuple(versions)
+    return "recipe-" + hashlib.md5(repr(state).encode()).hexdigest()
+
+
+def recipe_last_modified(request, pk, *args, **kwargs):
+    if request.user.is_authenticated:
+        return None
+    return Recipe.objects.filter(pk=pk).values_list(
+        "updated_at", flat=True).first()
@@ -22,17 +22,24 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method="get_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="get_is_in_shopping_cart")
+    search = filters.CharFilter(method="get_search")
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart",
+                  "search")
 
     def get_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(favoriting__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def get_search(self, queryset, name, value):
+        if value:
+            return queryset.search(value)
         return queryset
@@ -0,0 +1,115 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from api.cache import get_version
+from django.conf import settings
+from foodgram.db_routers import primary
+from recipes.models import Ingredient
+
+MAX_CHAR = "\U0010ffff"
+NGRAM_SIZE = 3
+# Необязательное ограничение числа результатов; по умолчанию
+# возвращаются все совпадения, как и без индекса.
+INGREDIENT_SEARCH_LIMIT = getattr(settings, "INGREDIENT_SEARCH_LIMIT", None)
+# Как часто пересобирать индекс, если кэш не хранит счетчик версий.
+INGREDIENT_INDEX_TIMEOUT = getattr(settings, "INGREDIENT_INDEX_TIMEOUT", 60)
+
+
+def ngrams(key, size):
+    return {key[start:start + size] for start in range(len(key) - size + 1)}
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Пересобирается при изменении счетчика версий ингредиентов, а если
+    кэш счетчик не хранит — не чаще раза в INGREDIENT_INDEX_TIMEOUT секунд.
+    Названия хранятся отсортированными без учета регистра,
+    поэтому совпадения по началу находятся бинарным поиском.
+    Совпадения по подстроке идут после совпадений по началу и берутся
+    из n-граммного индекса: перебираются только названия, содержащие
+    все n-граммы запроса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.built_at = None
+        self.index = ([], [], {})
+
+    def build(self):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit").iterator()
+        )
+        keys = [row[0] for row in rows]
+        entries = [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        # Номера названий по всем n-граммам длиной до NGRAM_SIZE:
+        # короткие запросы находятся по своей n-грамме целиком.
+        postings = defaultdict(list)
+        for number, key in enumerate(keys):
+            for size in range(1, NGRAM_SIZE + 1):
+                for gram in ngrams(key, size):
+                    postings[gram].append(number)
+        # Одно присваивание: поиск в другом потоке не увидит ключи
+        # нового индекса вместе с записями старого.
+        self.index = keys, entries, dict(postings)
+
+    def is_fresh(self, version):
+        if version is not None:
+            return version == self.version
+        return (
+            self.built_at is not None
+            and time.monotonic() - self.built_at < INGREDIENT_INDEX_TIMEOUT
+        )
+
+    def ensure_fresh(self):
+        version = get_version("ingredient")
+        if self.is_fresh(version):
+            return
+        with self.lock:
+            if not self.is_fresh(version):
+                with primary():
+                    self.build()
+                self.version = version
+                self.built_at = time.monotonic()
+
+    def substring_numbers(self, postings, query):
+        if len(query) <= NGRAM_SIZE:
+            return postings.get(query, [])
+        candidates = sorted(
+            (postings.get(gram, []) for gram in ngrams(query, NGRAM_SIZE)),
+            key=len,
+        )
+        numbers = set(candidates[0])
+        for posting in candidates[1:]:
+            numbers.intersection_update(posting)
+        return sorted(numbers)
+
+    def search(self, query):
+        self.ensure_fresh()
+        keys, entries, postings = self.index
+        query = query.casefold()
+        limit = INGREDIENT_SEARCH_LIMIT
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + MAX_CHAR, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        matches = entries[start:end]
+        for number in self.substring_numbers(postings, query):
+            if limit is not None and len(matches) >= limit:
+                break
+            # Совпадения по началу лежат подряд и уже в ответе.
+            if not start <= number < end and query in keys[number]:
+                matches.append(entries[number])
+        return matches
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,102 @@
+from api.authentication import token_cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from recipes.sample_data import seed_sample_data
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+PAGE_SIZES = (1, 30)
+
+# Путь, бюджет запросов для анонима и для пользователя.
+# None — эндпоинт не проверяется для этой роли.
+# Для путей с {limit} число запросов не должно зависеть от размера страницы.
+ENDPOINTS = (
+    ("/api/recipes/?limit={limit}", 6, 10),
+    ("/api/recipes/?limit={limit}&tags={tag_slug}", 7, 11),
+    ("/api/recipes/?limit={limit}&author={author}", 7, 11),
+    ("/api/recipes/?limit={limit}&is_favorited=1", None, 8),
+    ("/api/recipes/?limit={limit}&is_in_shopping_cart=1", None, 8),
+    ("/api/recipes/?limit={limit}&cursor=", 5, 9),
+    ("/api/recipes/{recipe}/", 7, 8),
+    ("/api/users/?limit={limit}", 2, 3),
+    ("/api/users/{author}/", None, 3),
+    ("/api/users/me/", None, 2),
+    ("/api/users/subscriptions/?limit={limit}&recipes_limit=3", None, 4),
+    ("/api/tags/", 1, 2),
+    ("/api/tags/{tag}/", 1, 2),
+    ("/api/ingredients/?name=ингр", 1, 2),
+    ("/api/ingredients/{ingredient}/", 1, 2),
+    ("/api/recipes/download_shopping_cart/", None, 2),
+)
+
+DUMMY_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет базу тестовыми данными внутри откатываемой транзакции "
+        "и проверяет число SQL-запросов каждого эндпоинта API."
+    )
+
+    def measure(self, client, path):
+        # Бюджет считается для холодного кэша токенов.
+        token_cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f"{path}: ответ {response.status_code}")
+        return context.captured_queries
+
+    def check_endpoint(self, client, role, template, budget, params):
+        counts = {}
+        for limit in PAGE_SIZES if "{limit}" in template else (None,):
+            path = template.format(limit=limit, **params)
+            queries = self.measure(client, path)
+            counts[limit] = len(queries)
+            if len(queries) > budget:
+                self.report(role, path, budget, queries)
+                return False
+        if len(set(counts.values())) > 1:
+            self.stdout.write(self.style.ERROR(
+                f"{role} {template}: число запросов зависит от размера "
+                f"страницы {counts}"
+            ))
+            return False
+        self.stdout.write(
+            f"{role:5} {template:60} {max(counts.values())}/{budget}")
+        return True
+
+    def report(self, role, path, budget, queries):
+        self.stdout.write(self.style.ERROR(
+            f"{role} {path}: {len(queries)} запросов при бюджете {budget}"))
+        for query in queries:
+            self.stdout.write(f"    {query['sql']}")
+
+    @override_settings(CACHES=DUMMY_CACHES, ALLOWED_HOSTS=["testserver"])
+    def handle(self, *args, **options):
+        failed = 0
+        with transaction.atomic():
+            params = seed_sample_data()
+            viewer = params.pop("viewer")
+            anonymous = APIClient()
+            authenticated = APIClient()
+            authenticated.credentials(HTTP_AUTHORIZATION="Token " + (
+                Token.objects.create(user=viewer).key))
+            for template, anonymous_budget, user_budget in ENDPOINTS:
+                for role, client, budget in (
+                    ("anon", anonymous, anonymous_budget),
+                    ("user", authenticated, user_budget),
+                ):
+                    if budget is not None and not self.check_endpoint(
+                        client, role, template, budget, params
+                    ):
+                        failed += 1
+            transaction.set_rollback(True)
+        if failed:
+            raise CommandError(f"Превышен бюджет запросов: {failed}.")
+        self.stdout.write(self.style.SUCCESS("Все эндпоинты в бюджете."))
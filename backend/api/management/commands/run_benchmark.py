@@ -0,0 +1,263 @@
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from api.benchmark import SCENARIOS, Benchmark, Collection, QueryCountingApp
+from api.benchmark import send as send_request
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler,
+                                          get_internal_wsgi_application)
+from django.db import connection
+
+COLLECTION_PATH = (
+    settings.BASE_DIR.parent / "postman-collection"
+    / "diploma.postman_collection.json"
+)
+RESULTS_DIR = settings.BASE_DIR / "benchmarks"
+PASSWORD = "Bench-pass-12345"
+
+# Команды gunicorn для --server: текущий синхронный WSGI и ASGI
+# с асинхронным чтением.
+SERVERS = {
+    "wsgi": ("foodgram.wsgi:application",),
+    "asgi": (
+        "foodgram.asgi:application",
+        "--worker-class", "uvicorn.workers.UvicornWorker",
+    ),
+}
+SERVER_START_TIMEOUT = 30
+# У gunicorn 20.0 нет __main__, поэтому без python -m gunicorn.
+GUNICORN = "from gunicorn.app.wsgiapp import run; run()"
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон API по сценариям из postman-коллекции: "
+        "p50/p95/p99, пропускная способность и число SQL на запрос. "
+        "Без --url поднимает сервер в процессе на текущей базе данных, "
+        "с --server — gunicorn в режиме WSGI или ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Адрес уже запущенного сервера.")
+        parser.add_argument(
+            "--server", choices=sorted(SERVERS),
+            help="Запустить gunicorn с WSGI или ASGI-приложением.",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1,
+            help="Число процессов gunicorn для --server.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            help="Сценарии через запятую, например feed,search_ingredients.",
+        )
+        parser.add_argument("--duration", type=float, default=30)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--recipes", type=int, default=20,
+            help="Сколько рецептов создать перед прогоном.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--collection", default=str(COLLECTION_PATH))
+        parser.add_argument("--output", help="Файл для результатов JSON.")
+        parser.add_argument(
+            "--compare", help="Результаты прошлого прогона для сравнения.")
+
+    def start_server(self):
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        server.set_app(QueryCountingApp(get_internal_wsgi_application()))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        return server, f"http://{host}:{port}"
+
+    def spawn_server(self, kind, workers):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        process = subprocess.Popen(
+            [
+                sys.executable, "-c", GUNICORN, *SERVERS[kind],
+                "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+            ],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, SERVER_TIMING="True"),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), 1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    process.kill()
+                    raise CommandError(f"Сервер {kind} не запустился.")
+                time.sleep(0.2)
+        return process, f"http://127.0.0.1:{port}"
+
+    def get_scenarios(self, names):
+        if not names:
+            return SCENARIOS
+        names = [name.strip() for name in names.split(",")]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f"Неизвестные сценарии: {', '.join(sorted(unknown))}.")
+        return {name: SCENARIOS[name] for name in names}
+
+    def send(self, name, variables, expected=(200, 201, 204)):
+        status, body, _ = send_request(self.collection, name, variables)
+        if status not in expected:
+            raise CommandError(f"{name}: ответ {status} {body[:200]!r}")
+        return json.loads(body) if body else None
+
+    def register(self, variables, number):
+        suffix = f"{int(time.time())}-{number}"
+        variables = dict(
+            variables,
+            email=json.dumps(f"bench-{suffix}@example.com"),
+            username=json.dumps(f"bench-{suffix}"),
+            password=json.dumps(PASSWORD),
+        )
+        user = self.send("create_first_user", variables)
+        token = self.send("get_token_for_first_user", variables)
+        return user["id"], token["auth_token"]
+
+    def prepare(self, base_url, options):
+        generator = random.Random(options["seed"])
+        variables = dict(self.collection.variables, baseUrl=base_url)
+        tags = self.send("get_tag_list // No Auth", variables)
+        ingredients = self.send("get_ingredients_list // No Auth", variables)
+        if len(tags) < 2 or len(ingredients) < 2:
+            raise CommandError("Нужны хотя бы два тэга и два ингредиента.")
+
+        def recipe_variables():
+            first_tag, second_tag = generator.sample(tags, 2)
+            first, second = generator.sample(ingredients, 2)
+            return {
+                "firstTagId": first_tag["id"],
+                "secondTagId": second_tag["id"],
+                "secondTagSlug": first_tag["slug"],
+                "thirdTagSlug": second_tag["slug"],
+                "firstIndredientId": first["id"],
+                "secondIndredientId": second["id"],
+                "ingredientNameFirstLatter": first["name"][:2],
+            }
+
+        author_id, author_token = self.register(variables, "author")
+        author = dict(variables, secondUserToken=author_token)
+        recipe_ids = [
+            self.send(
+                "create_first_recipe // Second User",
+                dict(author, **recipe_variables()),
+            )["id"]
+            for _ in range(options["recipes"])
+        ]
+        workers = []
+        for number in range(options["concurrency"]):
+            _, token = self.register(variables, number)
+            workers.append(dict(
+                variables,
+                userId=author_id,
+                userToken=token,
+                secondUserToken=token,
+                **recipe_variables(),
+            ))
+        return author, recipe_ids, workers
+
+    def cleanup(self, author, recipe_ids):
+        for recipe_id in recipe_ids:
+            self.send(
+                "delete_first_recipe // Second User",
+                dict(author, firstRecipeId=recipe_id),
+            )
+
+    def compare(self, results, path):
+        with open(path, encoding="utf-8") as source:
+            previous = json.load(source)
+        self.stdout.write(f"\nСравнение с {path}:")
+        self.stdout.write(
+            f"  пропускная способность: {previous['throughput_rps']} -> "
+            f"{results['throughput_rps']} запросов/с"
+        )
+        for endpoint, stats in results["endpoints"].items():
+            before = previous["endpoints"].get(endpoint)
+            if before:
+                self.stdout.write(
+                    f"  {endpoint:50} p95 {before['p95_ms']:>8} -> "
+                    f"{stats['p95_ms']:>8} мс"
+                )
+
+    def handle(self, *args, **options):
+        self.collection = Collection(options["collection"])
+        scenarios = self.get_scenarios(options["scenarios"])
+        server = process = None
+        base_url = options["url"]
+        if options["server"]:
+            process, base_url = self.spawn_server(
+                options["server"], options["workers"])
+        elif base_url is None:
+            server, base_url = self.start_server()
+        try:
+            author, recipe_ids, workers = self.prepare(base_url, options)
+            try:
+                results = Benchmark(
+                    self.collection, workers, recipe_ids, scenarios
+                ).run(options["duration"], options["seed"])
+            finally:
+                self.cleanup(author, recipe_ids)
+        finally:
+            if server is not None:
+                server.shutdown()
+            if process is not None:
+                process.terminate()
+                process.wait()
+        results["config"] = {
+            "url": options["url"] or options["server"] or "in-process",
+            "database": None if options["url"] else connection.vendor,
+            "workers": options["workers"] if process else None,
+            "concurrency": options["concurrency"],
+            "recipes": options["recipes"],
+            "scenarios": {name: weight for name, (weight, _) in
+                          scenarios.items()},
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.stdout.write(
+            f"{'эндпоинт':50} {'запросов':>8} {'ошибок':>6} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8} {'SQL':>6}"
+        )
+        for endpoint, stats in results["endpoints"].items():
+            self.stdout.write(
+                f"{endpoint:50} {stats['requests']:>8} {stats['errors']:>6} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} "
+                f"{stats['p99_ms']:>8} "
+                f"{stats['queries_per_request'] or '-':>6}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Всего {results['requests']} запросов за "
+            f"{results['duration_s']} с: "
+            f"{results['throughput_rps']} в секунду."
+        ))
+        output = Path(options["output"] or RESULTS_DIR / (
+            datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Результаты сохранены в {output}")
+        if options["compare"]:
+            self.compare(results, options["compare"])
@@ -0,0 +1,165 @@
+"""
+Гистограммы времени обработки запросов в текстовом формате Prometheus.
+
+Каждый процесс gunicorn копит значения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в METRICS_DIR/<pid>.json.
+/metrics суммирует файлы всех процессов, поэтому ответ не зависит от
+того, какой воркер его обслужил, и удаляет файлы завершившихся процессов.
+Каталог у каждого хоста свой: живость процесса проверяется по pid.
+
+Значения копятся только в процессах, запущенных через foodgram.wsgi или
+foodgram.asgi; тесты и management-команды метрики не пишут.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+HISTOGRAMS = {
+    "foodgram_request_duration_seconds": (
+        "Полное время обработки запроса.", DURATION_BUCKETS),
+    "foodgram_view_duration_seconds": (
+        "Время работы view до рендеринга ответа.", DURATION_BUCKETS),
+    "foodgram_render_duration_seconds": (
+        "Время рендеринга ответа DRF.", DURATION_BUCKETS),
+    "foodgram_db_duration_seconds": (
+        "Суммарное время SQL-запросов.", DURATION_BUCKETS),
+    "foodgram_db_queries": (
+        "Число SQL-запросов.", QUERY_BUCKETS),
+    "foodgram_response_size_bytes": (
+        "Размер тела ответа.", SIZE_BUCKETS),
+}
+
+
+def escape(value):
+    return (
+        str(value).replace("\\", "\\\\").replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def pid_alive(name):
+    """Жив ли процесс, чей pid записан в имени файла."""
+    try:
+        os.kill(int(name), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    """Гистограммы процесса с выгрузкой в общий каталог."""
+
+    def __init__(self, directory, flush_interval):
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.values = {}
+        self.flushed_at = 0
+        self.enabled = False
+
+    def enable(self):
+        """Включает сбор метрик; вызывается точками входа сервера."""
+        self.enabled = True
+
+    def observe(self, name, labels, value):
+        if not self.enabled:
+            return
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self.lock:
+            if self.pid != os.getpid():
+                # Значения, унаследованные от родителя после fork,
+                # уже учтены в его файле.
+                self.pid = os.getpid()
+                self.values = {}
+            data = self.values.setdefault(key, [0] * (len(buckets) + 2))
+            for number, bound in enumerate(buckets):
+                if value <= bound:
+                    data[number] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def flush(self, force=False):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self.flushed_at < self.flush_interval:
+            return
+        with self.lock:
+            self.flushed_at = now
+            rows = [
+                [name, list(labels), data]
+                for (name, labels), data in self.values.items()
+            ]
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{os.getpid()}.json"
+        temporary = path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(rows))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Сумма значений всех процессов."""
+        self.flush(force=True)
+        merged = {}
+        for path in self.directory.glob("*.json"):
+            if not pid_alive(path.stem):
+                # Воркер завершился: его значения больше не растут,
+                # а файлы перезапущенных воркеров копились бы без конца.
+                for stale in (path, path.with_suffix(".tmp")):
+                    stale.unlink(missing_ok=True)
+                continue
+            try:
+                rows = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, labels, data in rows:
+                if name not in HISTOGRAMS:
+                    continue
+                key = (name, tuple(tuple(label) for label in labels))
+                total = merged.setdefault(key, [0] * len(data))
+                for number, value in enumerate(data):
+                    total[number] += value
+        return merged
+
+    def render(self):
+        """Текстовый формат Prometheus."""
+        merged = self.collect()
+        lines = []
+        for name, (description, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), data in sorted(merged.items()):
+                if metric != name:
+                    continue
+                label_text = ",".join(
+                    f'{key}="{escape(value)}"' for key, value in labels)
+                prefix = label_text + "," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(buckets, data):
+                    cumulative += count
+                    lines.append(
+                        f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {data[-1]}')
+                lines.append(f"{name}_sum{{{label_text}}} {data[-2]}")
+                lines.append(f"{name}_count{{{label_text}}} {data[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsStore(
+    getattr(settings, "METRICS_DIR", "/tmp/foodgram-metrics"),
+    getattr(settings, "METRICS_FLUSH_INTERVAL", 1),
+)
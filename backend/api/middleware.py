@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+from contextvars import ContextVar
+from time import perf_counter
+
+from api.metrics import metrics
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from foodgram.db_routers import DATABASE_REPLICAS, read_replica, replica_health
+from rest_framework.permissions import SAFE_METHODS
+
+SERVER_TIMING = getattr(settings, "SERVER_TIMING", False)
+REPLICA_PIN_SECONDS = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+REPLICA_PIN_KEY = "replica-pin:{}"
+
+# Замеры текущего запроса. Переменная контекста, а не атрибут потока:
+# под ASGI SQL выполняется в других потоках, и sync_to_async и пул
+# асинхронного чтения переносят в них контекст запроса.
+current_profile = ContextVar("current_profile", default=None)
+
+
+class RequestProfile:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.view_started = None
+        self.view_ended = None
+        self.render_ended = None
+
+    def record_query(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += perf_counter() - started
+
+    def rendered(self, response):
+        self.render_ended = perf_counter()
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка execute, которую получает каждое соединение с базой."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.record_query(execute, sql, params, many, context)
+
+
+def view_finished(request, response):
+    """Отмечает конец работы view; время рендеринга считается отдельно."""
+    profile = getattr(request, "profile", None)
+    if profile is not None and profile.view_ended is None:
+        profile.view_ended = perf_counter()
+        response.add_post_render_callback(profile.rendered)
+
+
+class RequestProfilingMiddleware:
+    """
+    Число и время SQL-запросов, время view и рендеринга, размер ответа
+    по имени маршрута. При SERVER_TIMING добавляет заголовок Server-Timing.
+    Работает и под WSGI, и под ASGI без перехода в синхронный поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как у MiddlewareMixin: обработчик ASGI должен видеть
+            # корутину, иначе вынесет весь запрос в синхронный поток.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = request.profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        ended = perf_counter()
+        view_ended = profile.view_ended or ended
+        timings = {
+            "total": ended - profile.started,
+            "view": view_ended - (profile.view_started or profile.started),
+            "render": (
+                profile.render_ended - view_ended
+                if profile.render_ended else 0.0
+            ),
+            "db": profile.db,
+        }
+        self.observe(request, response, profile, timings)
+        if SERVER_TIMING:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f"{name};dur={duration * 1000:.1f}"
+                    for name, duration in timings.items() if name != "db"
+                ]
+                + [f'db;dur={profile.db * 1000:.1f};desc="{profile.queries} '
+                   f'queries"']
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        view_finished(request, response)
+        return response
+
+    def observe(self, request, response, profile, timings):
+        match = request.resolver_match
+        labels = (
+            ("route", match.view_name if match else "unmatched"),
+            ("method", request.method),
+            ("status", f"{response.status_code // 100}xx"),
+        )
+        metrics.observe(
+            "foodgram_request_duration_seconds", labels, timings["total"])
+        metrics.observe(
+            "foodgram_view_duration_seconds", labels, timings["view"])
+        metrics.observe(
+            "foodgram_render_duration_seconds", labels, timings["render"])
+        metrics.observe("foodgram_db_duration_seconds", labels, profile.db)
+        metrics.observe("foodgram_db_queries", labels, profile.queries)
+        if not response.streaming:
+            size = len(response.content)
+        else:
+            size = int(response.get("Content-Length", 0))
+        metrics.observe("foodgram_response_size_bytes", labels, size)
+        metrics.flush()
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Чтение безопасных запросов с реплики. После успешной записи клиент
+    REPLICA_PIN_SECONDS секунд читает с основной базы и видит свои
+    изменения. Клиент определяется по заголовку Authorization или по
+    cookie сессии. Без реплик в DATABASE_REPLICAS не подключается.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = read_replica.set(self.choose_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_replica.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = read_replica.set(self.choose_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_replica.reset(token)
+        self.pin(request, response)
+        return response
+
+    def pin_key(self, request):
+        client = request.META.get("HTTP_AUTHORIZATION") or request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME)
+        if not client:
+            return None
+        return REPLICA_PIN_KEY.format(
+            hashlib.md5(client.encode()).hexdigest())
+
+    def choose_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return None
+        key = self.pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        return replica_health.choose()
+
+    def pin(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        key = self.pin_key(request)
+        if key is not None:
+            cache.set(key, True, REPLICA_PIN_SECONDS)
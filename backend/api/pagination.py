@@ -1,6 +1,94 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+
+class RecipePagination(PageLimitPagination):
+    """
+    Пагинация ленты рецептов.
+    По умолчанию постраничная (page/limit). При наличии параметра cursor
+    включается курсорная пагинация по ключу (pub_date, id) без COUNT(*)
+    и OFFSET; для первой страницы передается пустой cursor.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        limit = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        if reverse:
+            ordering = ("pub_date", "id")
+        else:
+            ordering = ("-pub_date", "-id")
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            pub_date, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, id__gt=pk))
+            else:
+                queryset = queryset.filter(
+                    Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk))
+        results = list(queryset[:limit + 1])
+        has_more = len(results) > limit
+        results = results[:limit]
+        if reverse:
+            results.reverse()
+        self.next_position = self.previous_position = None
+        if results:
+            if has_more or reverse:
+                self.next_position = results[-1]
+            if (position is not None and not reverse) or (
+                    reverse and has_more):
+                self.previous_position = results[0]
+        return results
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None, False
+        try:
+            pub_date, pk, reverse = b64decode(
+                encoded.encode("ascii")).decode("ascii").split("|")
+            position = (parse_datetime(pub_date), int(pk))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse == "1"
+
+    def encode_cursor(self, recipe, reverse):
+        if recipe is None:
+            return None
+        token = f"{recipe.pub_date.isoformat()}|{recipe.id}|{int(reverse)}"
+        return replace_query_param(
+            remove_query_param(self.base_url, "page"),
+            self.cursor_query_param,
+            b64encode(token.encode("ascii")).decode("ascii"),
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ("next", self.encode_cursor(self.next_position, False)),
+            ("previous", self.encode_cursor(self.previous_position, True)),
+            ("results", data),
+        ]))
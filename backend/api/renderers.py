@@ -0,0 +1,39 @@
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """
+    Формат списка покупок для выбора по Accept или ?format=.
+    Сам ответ формирует view, поэтому render не вызывается.
+    """
+
+    charset = None
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = "application/json"
+    format = "json"
+
+
+# Первый формат выбирается при Accept: */*, поэтому PDF идет первым.
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListPDFRenderer,
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+)
@@ -1,12 +1,18 @@
 import base64
+import binascii
 import uuid
 
+from api.cache import author_scope, get_versions
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.base import ContentFile
+from django.db.models import Manager, prefetch_related_objects
 from django.db.transaction import atomic
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from foodgram.db_routers import primary
+from recipes.images import variant_name
 from recipes.models import (Favorite, Ingredient, IngredientRecipes, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 from rest_framework.validators import UniqueTogetherValidator
@@ -14,9 +20,18 @@ from users.models import Subscription
 
 User = get_user_model()
 
+RECIPES_LIMIT = 3
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n")
+BULK_RECIPES_LIMIT = 100
+
 
 class Base64ImageField(serializers.ImageField):
-    """Сериализатор для поля image."""
+    """
+    Сериализатор для поля image.
+    Изображение только сохраняется в хранилище: проверка Pillow и создание
+    копий выполняются в фоне (см. Recipe.image_status).
+    """
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
@@ -28,11 +43,112 @@ class Base64ImageField(serializers.ImageField):
                     Используйте форматы JPEG или PNG."
                 )
 
+            try:
+                content = base64.b64decode(img_str, validate=True)
+            except binascii.Error:
+                raise serializers.ValidationError(
+                    "Некорректные данные изображения.")
+            if not content.startswith(IMAGE_SIGNATURES):
+                raise serializers.ValidationError(
+                    "Загруженный файл не является изображением.")
             uid = uuid.uuid4()
-            data = ContentFile(base64.b64decode(img_str),
-                               name=uid.urn[9:] + "." + ext)
+            data = ContentFile(content, name=uid.urn[9:] + "." + ext)
+
+        return serializers.FileField.to_internal_value(self, data)
+
+
+def get_subscribed_ids(request):
+    """
+    Множество id авторов, на которых подписан пользователь запроса.
+    Загружается один раз за запрос.
+    """
+    if not hasattr(request, "subscribed_ids"):
+        request.subscribed_ids = set(
+            Subscription.objects.filter(user=request.user).values_list(
+                "author_id", flat=True)
+        )
+    return request.subscribed_ids
+
 
-        return super(Base64ImageField, self).to_internal_value(data)
+def is_subscribed(request, author_id):
+    if request is None or request.user.is_anonymous:
+        return False
+    return author_id in get_subscribed_ids(request)
+
+
+def personalize_recipe(fragment, is_favorited, is_in_shopping_cart,
+                       author_subscribed):
+    """Добавляет к общему для всех представлению рецепта отметки зрителя."""
+    return dict(
+        fragment,
+        author=dict(fragment["author"], is_subscribed=author_subscribed),
+        is_favorited=is_favorited,
+        is_in_shopping_cart=is_in_shopping_cart,
+    )
+
+
+def personalize_recipes(fragments, request):
+    """
+    Добавляет отметки пользователя к закэшированной странице рецептов:
+    по одному запросу на избранное, корзину и подписки.
+    """
+    favorited = in_cart = set()
+    user = request.user
+    if user.is_authenticated:
+        recipe_ids = [fragment["id"] for fragment in fragments]
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids).values_list(
+                "recipe_id", flat=True))
+        in_cart = set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids).values_list(
+                "recipe_id", flat=True))
+    return [
+        personalize_recipe(
+            fragment,
+            fragment["id"] in favorited,
+            fragment["id"] in in_cart,
+            is_subscribed(request, fragment["author"]["id"]),
+        )
+        for fragment in fragments
+    ]
+
+
+class ImageVariantField(serializers.Field):
+    """Ссылка на уменьшенную копию изображения рецепта."""
+
+    def __init__(self, size, fmt, **kwargs):
+        self.size = size
+        self.fmt = fmt
+        kwargs.setdefault("source", "*")
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        image = recipe.image
+        if not image or recipe.image_status != Recipe.IMAGE_READY:
+            return None
+        url = image.storage.url(variant_name(image.name, self.size, self.fmt))
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ImageVariantsSerializer(serializers.Serializer):
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    image_small_jpeg = ImageVariantField("small", "jpeg")
+    image_small_webp = ImageVariantField("small", "webp")
+    image_medium_jpeg = ImageVariantField("medium", "jpeg")
+    image_medium_webp = ImageVariantField("medium", "webp")
+
+
+IMAGE_VARIANT_FIELDS = (
+    "image_small_jpeg",
+    "image_small_webp",
+    "image_medium_jpeg",
+    "image_medium_webp",
+)
 
 
 class CustomUserSerializer(UserSerializer):
@@ -47,10 +163,9 @@ class CustomUserSerializer(UserSerializer):
                   "first_name", "last_name", "is_subscribed")
 
     def get_is_subscribed(self, obj):
-        user = self.context.get("request").user
-        if user is None or user.is_anonymous:
-            return False
-        return Subscription.objects.filter(user=user, author=obj).exists()
+        if hasattr(obj, "subscribed"):
+            return obj.subscribed
+        return is_subscribed(self.context.get("request"), obj.id)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -73,36 +188,53 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         return data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+def get_recipes_limit(request):
+    """Число рецептов автора из параметра recipes_limit."""
+    try:
+        limit = int(request.query_params.get("recipes_limit", RECIPES_LIMIT))
+    except (TypeError, ValueError):
+        return RECIPES_LIMIT
+    return max(limit, 0)
+
+
+class RecipeShortSerializer(ImageVariantsSerializer,
+                            serializers.ModelSerializer):
     """Сериализатор компактного отображения рецептов."""
 
     image = Base64ImageField()
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", *IMAGE_VARIANT_FIELDS,
+                  "cooking_time")
 
 
-class SubscriptionSerializer(ModelSerializer):
+class SubscriptionSerializer(CustomUserSerializer):
     """Сериализатор для модели Subscription."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
             "recipes", "recipes_count")
 
+    def get_recipes_limit(self):
+        request = self.context.get("request")
+        if request is None:
+            return RECIPES_LIMIT
+        return get_recipes_limit(request)
+
     def get_recipes(self, obj):
-        recipes = obj.recipes.all()[:3]
+        if hasattr(obj, "latest_recipes"):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()[:self.get_recipes_limit()]
         request = self.context.get("request")
         return RecipeShortSerializer(
             recipes, many=True, context={"request": request}
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class TagSerializer(ModelSerializer):
     """Сериализатор для модели Tag."""
@@ -136,10 +268,24 @@ class IngredientRecipesSerializer(ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов с пакетным чтением фрагментов из кэша."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        fragments = self.child.get_fragments(recipes)
+        return [
+            self.child.personalize(recipe, fragment)
+            for recipe, fragment in zip(recipes, fragments)
+        ]
+
+
+class RecipeSerializer(ImageVariantsSerializer, serializers.ModelSerializer):
     """
     Сериалайзер для модели Recipe.
     Используется на отображение необходимых полей при чтеннии.
+    Не зависящая от пользователя часть рецепта кэшируется фрагментом
+    по id и дате изменения, отметки пользователя добавляются поверх.
     """
 
     tags = TagSerializer(many=True, read_only=True)
@@ -161,12 +307,69 @@ class RecipeSerializer(serializers.ModelSerializer):
             "author",
             "ingredients",
             "image",
+            *IMAGE_VARIANT_FIELDS,
+            "image_status",
             "name",
             "text",
             "cooking_time",
             "is_favorited",
             "is_in_shopping_cart",
         )
+        list_serializer_class = RecipeListSerializer
+
+    def fragment_key(self, recipe, versions):
+        request = self.context.get("request")
+        host = request.get_host() if request is not None else ""
+        author_version = versions[author_scope(recipe.author_id)]
+        return (
+            f"recipe-fragment:{host}:{recipe.pk}:"
+            f"{recipe.updated_at.timestamp()}:{versions['tag']}:"
+            f"{versions['ingredient']}:{author_version}"
+        )
+
+    def build_fragment(self, recipe):
+        data = super().to_representation(recipe)
+        data.pop("is_favorited")
+        data.pop("is_in_shopping_cart")
+        data["author"] = dict(data["author"])
+        data["author"].pop("is_subscribed")
+        return dict(data)
+
+    def get_fragments(self, recipes):
+        names = ["tag", "ingredient"] + list({
+            author_scope(recipe.author_id) for recipe in recipes})
+        versions = dict(zip(names, get_versions(names)))
+        keys = [self.fragment_key(recipe, versions) for recipe in recipes]
+        fragments = cache.get_many(keys)
+        missing = {
+            key: recipe for key, recipe in zip(keys, recipes)
+            if key not in fragments
+        }
+        if missing:
+            with primary():
+                prefetch_related_objects(
+                    list(missing.values()),
+                    "amount_ingredients__ingredient", "tags")
+                built = {
+                    key: self.build_fragment(recipe)
+                    for key, recipe in missing.items()
+                }
+            cache.set_many(built, RECIPE_FRAGMENT_TIMEOUT)
+            fragments.update(built)
+        return [fragments[key] for key in keys]
+
+    def personalize(self, recipe, fragment):
+        if not self.context.get("personalize", True):
+            return fragment
+        return personalize_recipe(
+            fragment,
+            self.get_is_favorited(recipe),
+            self.get_is_in_shopping_cart(recipe),
+            is_subscribed(self.context.get("request"), recipe.author_id),
+        )
+
+    def to_representation(self, instance):
+        return self.personalize(instance, self.get_fragments([instance])[0])
 
     def validate_ingredients(self, data):
         ingredients = self.initial_data.get("ingredients")
@@ -179,17 +382,31 @@ class RecipeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Необходимо указать ингредиент!')
         return data
 
-    def get_is_favorited(self, object):
+    def get_user_flag(self, obj, flag):
+        """
+        Возвращает отметку пользователя из аннотации выборки.
+        Для неаннотированного рецепта обе отметки
+        загружаются одним запросом.
+        """
         request = self.context.get("request")
         if request is None or request.user.is_anonymous:
             return False
-        return request.user.favoriting.filter(recipe=object).exists()
+        if not hasattr(obj, flag):
+            flags = (
+                Recipe.objects.filter(pk=obj.pk)
+                .with_user_flags(request.user)
+                .values("is_favorited", "is_in_shopping_cart")
+                .first()
+            ) or {}
+            obj.is_favorited = flags.get("is_favorited", False)
+            obj.is_in_shopping_cart = flags.get("is_in_shopping_cart", False)
+        return getattr(obj, flag)
+
+    def get_is_favorited(self, object):
+        return self.get_user_flag(object, "is_favorited")
 
     def get_is_in_shopping_cart(self, object):
-        request = self.context.get("request")
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.shopping_cart.filter(recipe=object).exists()
+        return self.get_user_flag(object, "is_in_shopping_cart")
 
 
 class RecipteIngredientCreateSerializer(ModelSerializer):
@@ -199,7 +416,7 @@ class RecipteIngredientCreateSerializer(ModelSerializer):
     """
 
     id = serializers.IntegerField(write_only=True)
-    amount = serializers.IntegerField(write_only=True)
+    amount = serializers.IntegerField(write_only=True, min_value=1)
 
     class Meta:
         model = IngredientRecipes
@@ -233,13 +450,75 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             "cooking_time",
         )
 
+    def validate_ingredients(self, ingredients):
+        if not ingredients:
+            raise serializers.ValidationError("Необходимо указать ингредиент!")
+        ingredient_ids = {ingredient["id"] for ingredient in ingredients}
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError(
+                "Ингредиент не может повторяться!"
+            )
+        existing_ids = set(
+            Ingredient.objects.filter(id__in=ingredient_ids).values_list(
+                "id", flat=True)
+        )
+        missing_ids = ingredient_ids - existing_ids
+        if missing_ids:
+            raise serializers.ValidationError(
+                f"Ингредиенты не найдены: {sorted(missing_ids)}"
+            )
+        return ingredients
+
     def create_ingredients(self, ingredients, recipe):
-        for ingredient in ingredients:
-            ingredients, status = IngredientRecipes.objects.get_or_create(
+        IngredientRecipes.objects.bulk_create(
+            IngredientRecipes(
                 recipe=recipe,
-                ingredient=Ingredient.objects.get(id=ingredient["id"]),
+                ingredient_id=ingredient["id"],
                 amount=ingredient["amount"],
             )
+            for ingredient in ingredients
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к переданному списку:
+        удаляет лишние, обновляет количество и добавляет новые.
+        """
+        amounts = {
+            ingredient["id"]: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        current = {
+            row.ingredient_id: row for row in recipe.amount_ingredients.all()
+        }
+        removed_ids = []
+        changed = []
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        }
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id, 0)
+            if amount != row.amount:
+                deltas[ingredient_id] = amount - row.amount
+            if not amount:
+                removed_ids.append(row.id)
+            elif amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if removed_ids:
+            IngredientRecipes.objects.filter(id__in=removed_ids).delete()
+        if changed:
+            IngredientRecipes.objects.bulk_update(changed, ["amount"])
+        self.create_ingredients(
+            recipe=recipe,
+            ingredients=[
+                ingredient for ingredient in ingredients
+                if ingredient["id"] not in current
+            ],
+        )
+        ShoppingListItem.objects.change_recipe(recipe, deltas)
 
     @atomic
     def create(self, validated_data):
@@ -252,16 +531,19 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop("tags")
-        ingredients = validated_data.pop("ingredients")
+        tags = validated_data.pop("tags", None)
+        ingredients = validated_data.pop("ingredients", None)
         instance = super(RecipeCreateSerializer,
                          self).update(instance, validated_data)
-        instance.tags.set(tags)
-        self.create_ingredients(recipe=instance, ingredients=ingredients)
-        instance.save()
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(recipe=instance, ingredients=ingredients)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], "amount_ingredients__ingredient", "tags")
         return RecipeSerializer(
             instance, context={"request": self.context.get("request")}
         ).data
@@ -295,3 +577,13 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                 message="Вы уже добавили это рецепт в список покупок.",
             )
         ]
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT,
+    )
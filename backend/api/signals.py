@@ -0,0 +1,105 @@
+from functools import partial
+
+from api.authentication import auth_scope, token_cache
+from api.cache import author_scope, bump_recipe_scopes, bump_version
+from api.middleware import record_query
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from import_export.signals import post_import
+from recipes.models import Ingredient, IngredientRecipes, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+# Поля пользователя, которые входят в блок автора рецепта.
+AUTHOR_FIELDS = {"username", "email", "first_name", "last_name"}
+
+
+@receiver(connection_created)
+def profile_connection(sender, connection, **kwargs):
+    """Подключает учет SQL-запросов к соединению любого потока."""
+    if record_query not in connection.execute_wrappers:
+        # В начало списка: execute_wrapper() снимает последнюю обертку,
+        # а соединение могло открыться внутри такого блока.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Выход из системы: токен больше не берется из кэша."""
+    transaction.on_commit(partial(token_cache.discard, instance.key))
+    transaction.on_commit(
+        partial(bump_version, auth_scope(instance.user_id)))
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя."""
+    transaction.on_commit(partial(token_cache.discard_user, instance.pk))
+    transaction.on_commit(partial(bump_version, auth_scope(instance.pk)))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Сбрасывает кэш рецептов, в которых показаны данные автора."""
+    if created or (
+        update_fields is not None and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    transaction.on_commit(
+        partial(bump_version, author_scope(instance.pk)))
+    invalidate_recipe_lists(
+        list(instance.recipes.values_list("pk", flat=True)))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_import)
+def bump_ingredient_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, "ingredient"))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tag_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_version, "tag"))
+
+
+def invalidate_recipe_lists(recipe_ids, tag_ids=()):
+    """Сбрасывает после коммита кэш лент с тэгами и авторами рецептов."""
+    tag_slugs = list(
+        Tag.objects.filter(pk__in=tag_ids).values_list("slug", flat=True)
+    ) + list(
+        Tag.objects.filter(recipes__in=recipe_ids).values_list(
+            "slug", flat=True)
+    )
+    author_ids = list(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            "author_id", flat=True)
+    )
+    transaction.on_commit(
+        partial(bump_recipe_scopes, set(tag_slugs), set(author_ids)))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_recipe_lists([instance.pk])
+
+
+@receiver(post_save, sender=IngredientRecipes)
+@receiver(post_delete, sender=IngredientRecipes)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    invalidate_recipe_lists([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        invalidate_recipe_lists(pk_set or (), tag_ids=[instance.pk])
+    else:
+        invalidate_recipe_lists([instance.pk], tag_ids=pk_set or ())
@@ -0,0 +1,470 @@
+import csv
+import json
+from datetime import timedelta
+from io import StringIO
+
+from api.authentication import auth_scope, token_cache
+from api.cache import bump_version
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes.models import (Ingredient, IngredientRecipes, Recipe,
+                            ShoppingListItem, Tag)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users.models import User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        first_name=username,
+        last_name=username,
+        password="Password-123",
+    )
+
+
+def create_recipe(author, ingredients, tags=(), name="Рецепт"):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text="Описание",
+        cooking_time=10,
+        image="recipes/test.png",
+    )
+    recipe.tags.set(tags)
+    IngredientRecipes.objects.bulk_create(
+        IngredientRecipes(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients.items()
+    )
+    return recipe
+
+
+def shopping_list(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        "ingredient__name", "amount"))
+
+
+class APITest(APITestCase):
+    """Автор, зритель, тэг и ингредиенты для тестов API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author")
+        cls.viewer = create_user("viewer")
+        cls.tag = Tag.objects.create(
+            name="Завтрак", color="#E26C2D", slug="breakfast")
+        cls.salt, cls.flour, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (("соль", "г"), ("мука", "г"), ("молоко", "мл"))
+        )
+
+    def setUp(self):
+        # Кэш не откатывается вместе с транзакцией теста.
+        cache.clear()
+        token_cache.clear()
+        self.client.force_authenticate(self.viewer)
+
+
+class QueryBudgetTest(TestCase):
+    """Число SQL-запросов эндпоинтов API не выходит за бюджет."""
+
+    def test_endpoints_within_budget(self):
+        output = StringIO()
+        try:
+            call_command("check_query_budgets", stdout=output)
+        except CommandError as error:
+            self.fail(f"{error}\n{output.getvalue()}")
+
+
+class ShoppingListTest(APITest):
+    """Суммы списка покупок следуют за корзиной и рецептами в ней."""
+
+    def setUp(self):
+        super().setUp()
+        self.pancakes = create_recipe(
+            self.author, {self.salt: 5, self.flour: 100}, [self.tag])
+        self.porridge = create_recipe(
+            self.author, {self.salt: 3, self.milk: 200}, [self.tag])
+
+    def test_add_and_remove_recipes(self):
+        for recipe in (self.pancakes, self.porridge):
+            response = self.client.post(
+                f"/api/recipes/{recipe.pk}/shopping_cart/")
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            shopping_list(self.viewer),
+            {"соль": 8, "мука": 100, "молоко": 200},
+        )
+        response = self.client.delete(
+            f"/api/recipes/{self.pancakes.pk}/shopping_cart/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            shopping_list(self.viewer), {"соль": 3, "молоко": 200})
+
+    def test_ingredient_edit_updates_buyers(self):
+        self.client.post(f"/api/recipes/{self.pancakes.pk}/shopping_cart/")
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f"/api/recipes/{self.pancakes.pk}/",
+            {
+                "ingredients": [
+                    {"id": self.salt.pk, "amount": 7},
+                    {"id": self.milk.pk, "amount": 50},
+                ],
+                "tags": [self.tag.pk],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            shopping_list(self.viewer), {"соль": 7, "молоко": 50})
+        self.assertEqual(shopping_list(self.author), {})
+
+
+class CursorPaginationTest(APITest):
+    """Курсорная пагинация проходит ленту без пропусков и повторов."""
+
+    def setUp(self):
+        super().setUp()
+        recipes = [
+            create_recipe(self.author, {self.salt: 1}, name=f"Рецепт {i}")
+            for i in range(7)
+        ]
+        # Одинаковые даты у нескольких рецептов: порядок решает id.
+        now = timezone.now()
+        for number, recipe in enumerate(recipes):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(days=number // 3))
+        self.expected = list(Recipe.objects.order_by(
+            "-pub_date", "-id").values_list("id", flat=True))
+
+    def ids(self, response):
+        return [recipe["id"] for recipe in response.data["results"]]
+
+    def test_pages_cover_feed_once(self):
+        response = self.client.get("/api/recipes/?cursor=&limit=2")
+        seen = self.ids(response)
+        self.assertIsNone(response.data["previous"])
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            self.assertEqual(response.status_code, 200)
+            seen += self.ids(response)
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_returns_to_prior_page(self):
+        first = self.client.get("/api/recipes/?cursor=&limit=2")
+        second = self.client.get(first.data["next"])
+        self.assertEqual(self.ids(second), self.expected[2:4])
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(self.ids(previous), self.ids(first))
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/recipes/?cursor=broken")
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeListCacheTest(APITest):
+    """Общий кэш ленты сбрасывается изменениями и не хранит личных лент."""
+
+    def setUp(self):
+        super().setUp()
+        self.pancakes = create_recipe(
+            self.author, {self.salt: 5}, [self.tag], name="Блины")
+        self.client.force_authenticate(None)
+
+    def names(self, response):
+        return [recipe["name"] for recipe in response.data["results"]]
+
+    def test_page_is_cached(self):
+        self.client.get("/api/recipes/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/recipes/")
+        self.assertEqual(self.names(response), ["Блины"])
+
+    def test_new_recipe_invalidates_filtered_page(self):
+        url = "/api/recipes/?tags=breakfast"
+        self.assertEqual(self.names(self.client.get(url)), ["Блины"])
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(
+                self.author, {self.salt: 1}, [self.tag], name="Каша")
+        self.assertEqual(
+            self.names(self.client.get(url)), ["Каша", "Блины"])
+
+    def test_personal_filters_bypass_cache(self):
+        self.client.get("/api/recipes/?is_favorited=1")
+        self.assertEqual(
+            self.names(self.client.get("/api/recipes/")), ["Блины"])
+        self.client.force_authenticate(self.viewer)
+        self.client.post(f"/api/recipes/{self.pancakes.pk}/favorite/")
+        response = self.client.get("/api/recipes/?is_favorited=1")
+        self.assertEqual(self.names(response), ["Блины"])
+        self.client.force_authenticate(self.author)
+        response = self.client.get("/api/recipes/?is_favorited=1")
+        self.assertEqual(self.names(response), [])
+
+
+class RecipeFragmentTest(APITest):
+    """Кэшированные части рецепта обновляются, отметки у каждого свои."""
+
+    def setUp(self):
+        super().setUp()
+        self.pancakes = create_recipe(
+            self.author, {self.salt: 5}, [self.tag], name="Блины")
+        self.detail_url = f"/api/recipes/{self.pancakes.pk}/"
+
+    def responses(self):
+        return (
+            self.client.get(self.detail_url).data,
+            self.client.get("/api/recipes/").data["results"][0],
+        )
+
+    def test_author_change_reaches_fragments(self):
+        self.responses()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = "chef"
+            self.author.save()
+        for recipe in self.responses():
+            self.assertEqual(recipe["author"]["username"], "chef")
+
+    def test_tag_change_reaches_fragments(self):
+        self.responses()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = "Обед"
+            self.tag.save()
+        for recipe in self.responses():
+            self.assertEqual(recipe["tags"][0]["name"], "Обед")
+
+    def test_user_flags_are_personal(self):
+        self.client.post(f"/api/recipes/{self.pancakes.pk}/favorite/")
+        for recipe in self.responses():
+            self.assertTrue(recipe["is_favorited"])
+        self.client.force_authenticate(self.author)
+        for recipe in self.responses():
+            self.assertFalse(recipe["is_favorited"])
+            self.assertFalse(recipe["author"]["is_subscribed"])
+
+
+class RecipeIngredientsUpdateTest(APITest):
+    """Изменение рецепта затрагивает только изменившиеся ингредиенты."""
+
+    def test_update_applies_diff(self):
+        sugar = Ingredient.objects.create(name="сахар", measurement_unit="г")
+        recipe = create_recipe(
+            self.author, {self.salt: 5, self.flour: 100, self.milk: 200},
+            [self.tag],
+        )
+        rows = {
+            row.ingredient_id: row.pk
+            for row in recipe.amount_ingredients.all()
+        }
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f"/api/recipes/{recipe.pk}/",
+            {
+                "ingredients": [
+                    {"id": self.salt.pk, "amount": 5},
+                    {"id": self.flour.pk, "amount": 150},
+                    {"id": sugar.pk, "amount": 20},
+                ],
+                "tags": [self.tag.pk],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        current = {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in recipe.amount_ingredients.all()
+        }
+        self.assertEqual(current[self.salt.pk], (rows[self.salt.pk], 5))
+        self.assertEqual(current[self.flour.pk], (rows[self.flour.pk], 150))
+        self.assertNotIn(self.milk.pk, current)
+        self.assertEqual(current[sugar.pk][1], 20)
+
+
+class TokenCacheTest(APITest):
+    """Токен из кэша не требует запроса и отзывается во всех процессах."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.token = Token.objects.create(user=self.viewer)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(self.me(), 200)
+
+    def me(self):
+        return self.client.get("/api/users/me/").status_code
+
+    def test_cached_token_skips_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.me(), 200)
+        self.assertFalse(any(
+            Token._meta.db_table in query["sql"] for query in queries))
+
+    def test_logout_revokes_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.me(), 401)
+
+    def test_deactivation_revokes_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.viewer.is_active = False
+            self.viewer.save()
+        self.assertEqual(self.me(), 401)
+
+    def test_revocation_in_other_process(self):
+        # Другой процесс деактивировал пользователя: здешний кэш
+        # не сброшен, но счетчик в общем кэше изменился.
+        User.objects.filter(pk=self.viewer.pk).update(is_active=False)
+        self.assertEqual(self.me(), 200)
+        bump_version(auth_scope(self.viewer.pk))
+        self.assertEqual(self.me(), 401)
+
+
+class BulkUserRecipesTest(APITest):
+    """Массовые избранное и корзина: итог по каждому id и счетчики."""
+
+    def setUp(self):
+        super().setUp()
+        self.pancakes = create_recipe(
+            self.author, {self.salt: 5, self.flour: 100}, name="Блины")
+        self.porridge = create_recipe(
+            self.author, {self.salt: 3, self.milk: 200}, name="Каша")
+        self.ids = [self.pancakes.pk, self.porridge.pk, 999999]
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [
+            (result["id"], result["status"])
+            for result in response.data["results"]
+        ]
+
+    def favorites_counts(self):
+        return list(Recipe.objects.filter(
+            pk__in=self.ids).order_by("pk").values_list(
+                "favorites_count", flat=True))
+
+    def test_bulk_favorite(self):
+        self.client.post(f"/api/recipes/{self.pancakes.pk}/favorite/")
+        response = self.client.post(
+            "/api/recipes/favorite/",
+            {"recipes": self.ids + [self.porridge.pk]},
+            format="json",
+        )
+        self.assertEqual(self.statuses(response), [
+            (self.pancakes.pk, "exists"),
+            (self.porridge.pk, "added"),
+            (999999, "not_found"),
+        ])
+        self.assertEqual(self.favorites_counts(), [1, 1])
+        response = self.client.delete(
+            "/api/recipes/favorite/",
+            {"recipes": [self.pancakes.pk, 999999]},
+            format="json",
+        )
+        self.assertEqual(self.statuses(response), [
+            (self.pancakes.pk, "removed"), (999999, "not_found"),
+        ])
+        self.assertEqual(self.favorites_counts(), [0, 1])
+        response = self.client.delete(
+            "/api/recipes/favorite/",
+            {"recipes": [self.pancakes.pk]},
+            format="json",
+        )
+        self.assertEqual(
+            self.statuses(response), [(self.pancakes.pk, "missing")])
+        self.assertEqual(self.favorites_counts(), [0, 1])
+
+    def test_bulk_shopping_cart(self):
+        response = self.client.post(
+            "/api/recipes/shopping_cart/", {"recipes": self.ids},
+            format="json",
+        )
+        self.assertEqual(self.statuses(response), [
+            (self.pancakes.pk, "added"),
+            (self.porridge.pk, "added"),
+            (999999, "not_found"),
+        ])
+        self.assertEqual(
+            shopping_list(self.viewer),
+            {"соль": 8, "мука": 100, "молоко": 200},
+        )
+        response = self.client.delete(
+            "/api/recipes/shopping_cart/",
+            {"recipes": [self.pancakes.pk]},
+            format="json",
+        )
+        self.assertEqual(
+            self.statuses(response), [(self.pancakes.pk, "removed")])
+        self.assertEqual(
+            shopping_list(self.viewer), {"соль": 3, "молоко": 200})
+
+    def test_invalid_ids(self):
+        response = self.client.post(
+            "/api/recipes/favorite/", {"recipes": ["x"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class ShoppingListExportTest(APITest):
+    """Список покупок в PDF, тексте, CSV и JSON по ?format= и Accept."""
+
+    url = "/api/recipes/download_shopping_cart/"
+
+    def setUp(self):
+        super().setUp()
+        for ingredients in (
+            {self.salt: 5, self.flour: 100}, {self.salt: 3, self.milk: 200},
+        ):
+            recipe = create_recipe(self.author, ingredients)
+            self.client.post(f"/api/recipes/{recipe.pk}/shopping_cart/")
+
+    def download(self, **kwargs):
+        response = self.client.get(self.url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        content = b"".join(response.streaming_content)
+        return response["Content-Type"], content
+
+    def test_text(self):
+        content_type, content = self.download(data={"format": "txt"})
+        self.assertEqual(content_type, "text/plain; charset=utf-8")
+        self.assertEqual(content.decode(), (
+            "Список покупок.\n"
+            "1. молоко: 200 мл.\n"
+            "2. мука: 100 г.\n"
+            "3. соль: 8 г.\n"
+        ))
+
+    def test_csv(self):
+        content_type, content = self.download(data={"format": "csv"})
+        self.assertEqual(content_type, "text/csv; charset=utf-8")
+        self.assertEqual(list(csv.reader(content.decode().splitlines())), [
+            ["name", "measurement_unit", "amount"],
+            ["молоко", "мл", "200"],
+            ["мука", "г", "100"],
+            ["соль", "г", "8"],
+        ])
+
+    def test_json(self):
+        content_type, content = self.download(data={"format": "json"})
+        self.assertEqual(content_type, "application/json")
+        self.assertEqual(json.loads(content), [
+            {"name": "молоко", "measurement_unit": "мл", "amount": 200},
+            {"name": "мука", "measurement_unit": "г", "amount": 100},
+            {"name": "соль", "measurement_unit": "г", "amount": 8},
+        ])
+
+    def test_accept_negotiation(self):
+        content_type, _ = self.download(HTTP_ACCEPT="text/csv")
+        self.assertTrue(content_type.startswith("text/csv"))
+        for accept in ("application/pdf", "*/*"):
+            content_type, content = self.download(HTTP_ACCEPT=accept)
+            self.assertEqual(content_type, "application/pdf")
+            self.assertTrue(content.startswith(b"%PDF"))
+        response = self.client.get(self.url, HTTP_ACCEPT="image/png")
+        self.assertEqual(response.status_code, 406)
+        self.assertEqual(response["Content-Type"], "application/json")
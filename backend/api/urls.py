@@ -1,5 +1,7 @@
+from api.async_views import async_read_urls
 from api.views import (CustomUserViewSet, FavoriteViewSet, IngredientViewSet,
                        RecipeViewSet, ShoppingCartViewSet, TagViewSet)
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
@@ -11,6 +13,10 @@ router_v1.register(r"recipes", RecipeViewSet, basename="recipe")
 router_v1.register(r"ingredients", IngredientViewSet, basename="ingredient")
 router_v1.register(r"tags", TagViewSet, basename="tag")
 
+router_urls = router_v1.urls
+if getattr(settings, "ASYNC_READS", False):
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
     path(
         "recipes/<int:pk>/favorite/",
@@ -28,12 +34,26 @@ urlpatterns = [
         ),
         name="add_shopping_cart-remove_shopping_cart",
     ),
+    path(
+        "recipes/favorite/",
+        FavoriteViewSet.as_view(
+            {"post": "bulk_favorite", "delete": "bulk_favorite"}
+        ),
+        name="bulk_favorite",
+    ),
+    path(
+        "recipes/shopping_cart/",
+        ShoppingCartViewSet.as_view(
+            {"post": "bulk_shopping_cart", "delete": "bulk_shopping_cart"}
+        ),
+        name="bulk_shopping_cart",
+    ),
     path(
         "recipes/download_shopping_cart/",
         ShoppingCartViewSet.as_view({"get": "download_shopping_cart"}),
         name="download_shopping_cart",
     ),
-    path("", include(router_v1.urls)),
+    path("", include(router_urls)),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
 ]
@@ -1,38 +1,141 @@
-import io
+import csv
+import json
+import tempfile
+from itertools import chain, islice
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = "Arial"
+FONT_FILE = settings.BASE_DIR / "arial.ttf"
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+ROWS_CHUNK_SIZE = 500
+
+
+def register_fonts():
+    """Регистрирует шрифт для PDF один раз на процесс."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_FILE), "UTF-8"))
+
+
+def iter_file_chunks(file):
+    """Отдает содержимое файла частями и закрывает его."""
+    try:
+        file.seek(0)
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+def stream_rows(queryset, chunk_size=ROWS_CHUNK_SIZE):
+    """
+    Строки выборки с серверного курсора порциями по chunk_size.
+    Первая порция читается сразу: курсор открывается в потоке view,
+    а не при отправке ответа, которую под ASGI ведет цикл событий.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    return chain(list(islice(rows, chunk_size)), rows)
+
+
+def shopping_list_line(number, ingredient):
+    return (
+        f"{number}. {ingredient['ingredient__name']}: "
+        f"{ingredient['ingredient_value']} "
+        f"{ingredient['ingredient__measurement_unit']}."
+    )
+
+
+def shopping_cart_text(ingredients_cart):
+    """Список покупок простым текстом."""
+    lines = (
+        shopping_list_line(number, ingredient) + "\n"
+        for number, ingredient in enumerate(
+            stream_rows(ingredients_cart), start=1)
+    )
+    response = StreamingHttpResponse(
+        chain(["Список покупок.\n"], lines),
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Content-Disposition"] = "attachment;filename='shopping_cart.txt'"
+    return response
+
+
+class Echo:
+    """Псевдофайл для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(ingredients_cart):
+    """Список покупок в CSV: название, единица измерения, количество."""
+    writer = csv.writer(Echo())
+    rows = (
+        writer.writerow((
+            ingredient["ingredient__name"],
+            ingredient["ingredient__measurement_unit"],
+            ingredient["ingredient_value"],
+        ))
+        for ingredient in stream_rows(ingredients_cart)
+    )
+    response = StreamingHttpResponse(
+        chain([writer.writerow(("name", "measurement_unit", "amount"))], rows),
+        content_type="text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = "attachment;filename='shopping_cart.csv'"
+    return response
+
+
+def json_array(items):
+    yield "["
+    for number, item in enumerate(items):
+        yield ("," if number else "") + item
+    yield "]"
+
+
+def shopping_cart_json(ingredients_cart):
+    """Список покупок массивом JSON, собираемым по строке."""
+    items = (
+        json.dumps({
+            "name": ingredient["ingredient__name"],
+            "measurement_unit": ingredient["ingredient__measurement_unit"],
+            "amount": ingredient["ingredient_value"],
+        }, ensure_ascii=False)
+        for ingredient in stream_rows(ingredients_cart)
+    )
+    return StreamingHttpResponse(
+        json_array(items), content_type="application/json")
+
 
 def create_shopping_cart(ingredients_cart):
     """Функция формирования списка покупок."""
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = "attachment;filename='shopping_cart.pdf'"
-    pdfmetrics.registerFont(TTFont("Arial", "arial.ttf", "UTF-8"))
-    buffer = io.BytesIO()
+    register_fonts()
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
     pdf_file = canvas.Canvas(buffer)
-    pdf_file.setFont("Arial", 24)
+    pdf_file.setFont(FONT_NAME, 24)
     pdf_file.drawString(200, 800, "Список покупок.")
-    pdf_file.setFont("Arial", 14)
+    pdf_file.setFont(FONT_NAME, 14)
     from_bottom = 750
     for number, ingredient in enumerate(ingredients_cart, start=1):
         pdf_file.drawString(
-            50,
-            from_bottom,
-            f"{number}. {ingredient['ingredient__name']}: "
-            f"{ingredient['ingredient_value']} "
-            f"{ingredient['ingredient__measurement_unit']}.",
-        )
+            50, from_bottom, shopping_list_line(number, ingredient))
         from_bottom -= 20
         if from_bottom <= 50:
             from_bottom = 800
             pdf_file.showPage()
-            pdf_file.setFont("Arial", 14)
+            pdf_file.setFont(FONT_NAME, 14)
     pdf_file.showPage()
     pdf_file.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
+    response = StreamingHttpResponse(
+        iter_file_chunks(buffer), content_type="application/pdf")
+    response["Content-Disposition"] = "attachment;filename='shopping_cart.pdf'"
+    response["Content-Length"] = buffer.tell()
     return response
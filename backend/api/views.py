@@ -1,22 +1,38 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.core.cache import cache
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, prefetch_related_objects)
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
 from djoser.views import UserViewSet
+from foodgram.db_routers import primary
 from rest_framework import decorators, permissions, response, status, viewsets
+from rest_framework.renderers import JSONRenderer
 
+from api.cache import (RECIPE_LIST_CACHE_TIMEOUT, ingredient_etag,
+                       recipe_etag, recipe_last_modified,
+                       recipe_list_cache_key, tag_etag)
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import PageLimitPagination
+from api.ingredient_index import ingredient_index
+from api.metrics import metrics
+from api.pagination import PageLimitPagination, RecipePagination
 from api.permissions import SAFE_METHODS, AuthorOrReadOnly
+from api.renderers import SHOPPING_LIST_RENDERERS
 from api.serializers import (CustomUserSerializer, FavoriteSerializer,
                              IngredientSerializer, RecipeCreateSerializer,
-                             RecipeSerializer, RecipeShortSerializer,
+                             RecipeIdsSerializer, RecipeSerializer,
+                             RecipeShortSerializer,
                              ShoppingCartSerializer, SubscriptionSerializer,
-                             TagSerializer)
-from api.utils import create_shopping_cart
-from recipes.models import (Favorite, Ingredient, IngredientRecipes, Recipe,
-                            ShoppingCart, Tag)
+                             TagSerializer, get_recipes_limit,
+                             personalize_recipes)
+from api.utils import (create_shopping_cart, shopping_cart_csv,
+                       shopping_cart_json, shopping_cart_text)
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
 
 from users.models import Subscription
 
@@ -30,6 +46,14 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    @method_decorator(condition(etag_func=tag_etag))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(condition(etag_func=tag_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для создания обьектов класса Ingredient."""
@@ -43,6 +67,17 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
         "^name",
     ]
 
+    @method_decorator(condition(etag_func=ingredient_etag))
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if name:
+            return response.Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(condition(etag_func=ingredient_etag))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для создания обьектов класса Recipe."""
@@ -53,13 +88,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
     ordering_fields = ()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
 
     def get_queryset(self):
-        recipes = Recipe.objects.prefetch_related(
-            "amount_ingredients__ingredient", "tags"
-        ).all()
+        recipes = Recipe.objects.select_related("author").with_user_flags(
+            self.request.user)
         return recipes
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["personalize"] = getattr(self, "personalize", True)
+        return context
+
+    def list(self, request, *args, **kwargs):
+        cache_key = recipe_list_cache_key(request)
+        if cache_key is None:
+            return super().list(request, *args, **kwargs)
+        data = cache.get(cache_key)
+        if data is None:
+            self.personalize = False
+            # Кэш заполняется с основной базы: отставшая реплика
+            # сохранила бы старые данные под новой версией.
+            with primary():
+                list_response = super().list(request, *args, **kwargs)
+            if list_response.status_code != status.HTTP_200_OK:
+                return list_response
+            data = list_response.data
+            cache.set(cache_key, data, RECIPE_LIST_CACHE_TIMEOUT)
+        return response.Response(
+            dict(data, results=personalize_recipes(data["results"], request))
+        )
+
+    @method_decorator(condition(etag_func=recipe_etag,
+                                last_modified_func=recipe_last_modified))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
@@ -79,6 +143,15 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     pagination_class = PageLimitPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action == "list" and user.is_authenticated:
+            queryset = queryset.annotate(subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef("pk"))
+            ))
+        return queryset
+
     @decorators.action(detail=False, methods=["POST"])
     def set_password(self, request):
         serializer = SetPasswordSerializer(
@@ -91,7 +164,7 @@ class CustomUserViewSet(UserViewSet):
 
             if self.request.user.check_password(current_password):
                 self.request.user.set_password(new_password)
-                self.request.user.save()
+                self.request.user.save(update_fields=["password"])
                 return response.Response(status=204)
             else:
                 return response.Response(
@@ -138,14 +211,51 @@ class CustomUserViewSet(UserViewSet):
                        permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
         user = request.user
-        follows = User.objects.filter(following__user=user)
+        follows = User.objects.filter(following__user=user).annotate(
+            subscribed=Value(True, output_field=BooleanField()),
+        ).order_by("id")
         page = self.paginate_queryset(follows)
+        prefetch_related_objects(page, Prefetch(
+            "recipes",
+            queryset=Recipe.objects.filter(author__in=page).latest_by_author(
+                get_recipes_limit(request)),
+            to_attr="latest_recipes",
+        ))
         serializer = SubscriptionSerializer(
             page, many=True, context={"request": request}
         )
         return self.get_paginated_response(serializer.data)
 
 
+def bulk_user_recipes(request, model):
+    """
+    Добавляет (POST) или удаляет (DELETE) рецепты из списка id
+    и возвращает итог по каждому id.
+    """
+    serializer = RecipeIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = list(dict.fromkeys(serializer.validated_data["recipes"]))
+    recipes = Recipe.objects.in_bulk(recipe_ids)
+    found = [pk for pk in recipe_ids if pk in recipes]
+    if request.method == "POST":
+        changed = set(model.objects.bulk_add(request.user.id, found))
+        done, skipped = "added", "exists"
+    else:
+        changed = set(model.objects.bulk_remove(request.user.id, found))
+        done, skipped = "removed", "missing"
+    results = []
+    for pk in recipe_ids:
+        if pk not in recipes:
+            results.append({"id": pk, "status": "not_found"})
+            continue
+        results.append({
+            "id": pk,
+            "status": done if pk in changed else skipped,
+            "recipe": RecipeShortSerializer(recipes[pk]).data,
+        })
+    return response.Response({"results": results})
+
+
 class FavoriteViewSet(viewsets.ViewSet):
     """Вьюсет для создания обьектов класса Favorite."""
 
@@ -176,6 +286,24 @@ class FavoriteViewSet(viewsets.ViewSet):
         favorite_recipe.delete()
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    @decorators.action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite",
+        url_name="bulk_favorite",
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        return bulk_user_recipes(request, Favorite)
+
+
+SHOPPING_LIST_EXPORTS = {
+    "pdf": create_shopping_cart,
+    "txt": shopping_cart_text,
+    "csv": shopping_cart_csv,
+    "json": shopping_cart_json,
+}
+
 
 class ShoppingCartViewSet(viewsets.ViewSet):
     """Вьюсет для создания обьектов класса ShoppingCart."""
@@ -209,6 +337,16 @@ class ShoppingCartViewSet(viewsets.ViewSet):
         shopping_cart_recipe.delete()
         return response.Response(status=status.HTTP_204_NO_CONTENT)
 
+    @decorators.action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart",
+        url_name="bulk_shopping_cart",
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request):
+        return bulk_user_recipes(request, ShoppingCart)
+
     @decorators.action(
         detail=False,
         methods=["get"],
@@ -218,13 +356,33 @@ class ShoppingCartViewSet(viewsets.ViewSet):
     )
     def download_shopping_cart(self, request):
         ingredients_cart = (
-            IngredientRecipes.objects.filter(
-                recipe__shopping_cart__user=request.user)
+            ShoppingListItem.objects.filter(user=request.user)
             .values(
                 "ingredient__name",
                 "ingredient__measurement_unit",
+                ingredient_value=F("amount"),
             )
             .order_by("ingredient__name")
-            .annotate(ingredient_value=Sum("amount"))
         )
-        return create_shopping_cart(ingredients_cart)
+        return SHOPPING_LIST_EXPORTS[request.accepted_renderer.format](
+            ingredients_cart)
+
+    def get_renderers(self):
+        if self.action == "download_shopping_cart":
+            return [renderer() for renderer in SHOPPING_LIST_RENDERERS]
+        return super().get_renderers()
+
+    def handle_exception(self, exc):
+        if self.action == "download_shopping_cart":
+            # Форматы списка покупок не рендерят ошибки: они идут в JSON.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+
+def metrics_view(request):
+    """Метрики запросов в текстовом формате Prometheus."""
+    return HttpResponse(
+        metrics.render(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
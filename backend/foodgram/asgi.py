@@ -5,12 +5,31 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+
+Под ASGI чтение рецептов, тэгов, ингредиентов и подписок обслуживают
+асинхронные view (api.async_views). Запуск:
+
+    gunicorn foodgram.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodgram.settings")
+os.environ.setdefault("ASYNC_READS", "True")
+
+django_application = get_asgi_application()
+
+from api.metrics import metrics  # noqa: E402
+
+metrics.enable()
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    # Django 3.2 выполняет синхронный код всех запросов в одном общем
+    # потоке. В отдельном контексте у каждого запроса свой поток, как
+    # в Django 4, и синхронные view и middleware не ждут друг друга.
+    async with ThreadSensitiveContext():
+        await django_application(scope, receive, send)
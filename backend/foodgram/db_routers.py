@@ -0,0 +1,101 @@
+"""
+Чтение с реплик базы данных.
+
+ReplicaRoutingMiddleware выбирает реплику для безопасного запроса, и все
+его чтения идут на нее; остальной код, включая команды и фоновые потоки,
+работает с основной базой. Реплика, не ответившая на проверку, исключается из
+выбора на REPLICA_HEALTH_INTERVAL секунд.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, Error, connections
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICAS = getattr(settings, "DATABASE_REPLICAS", ())
+REPLICA_HEALTH_INTERVAL = getattr(settings, "REPLICA_HEALTH_INTERVAL", 5)
+
+# Модели, которые читаются только с основной базы: токен и сессия
+# нужны сразу после входа, когда реплика может еще отставать.
+PRIMARY_ONLY_MODELS = ("authtoken.token", "sessions.session")
+
+read_replica = ContextVar("read_replica", default=None)
+
+
+@contextmanager
+def primary():
+    """Чтение с основной базы, например для заполнения кэша."""
+    token = read_replica.set(None)
+    try:
+        yield
+    finally:
+        read_replica.reset(token)
+
+
+class ReplicaHealth:
+    """Доступность реплик с проверкой не чаще раза в interval секунд."""
+
+    def __init__(self, aliases, interval):
+        self.aliases = aliases
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.checked = {}
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Error:
+            logger.warning("Реплика %s недоступна", alias, exc_info=True)
+            connection.close()
+            return False
+        return True
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            checked_at, healthy = self.checked.get(alias, (None, True))
+            expired = checked_at is None or now - checked_at >= self.interval
+            if expired:
+                # Пока идет проверка, остальные потоки видят прошлый итог.
+                self.checked[alias] = (now, healthy)
+        if expired:
+            healthy = self.check(alias)
+            with self.lock:
+                self.checked[alias] = (now, healthy)
+        return healthy
+
+    def choose(self):
+        aliases = [alias for alias in self.aliases if self.is_healthy(alias)]
+        return random.choice(aliases) if aliases else None
+
+
+replica_health = ReplicaHealth(DATABASE_REPLICAS, REPLICA_HEALTH_INTERVAL)
+
+
+class ReplicaRouter:
+    """Запись и миграции — в основную базу, чтение — по read_replica."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_replica.get()
+        if alias and model._meta.label_lower not in PRIMARY_ONLY_MODELS:
+            return alias
+        # Явный ответ, иначе Django возьмет базу, из которой прочитан
+        # связанный объект, то есть реплику.
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
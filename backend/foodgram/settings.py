@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "djoser",
@@ -31,6 +32,8 @@ INSTALLED_APPS = [
 IMPORT_EXPORT_USE_TRANSACTIONS = True
 
 MIDDLEWARE = [
+    "api.middleware.RequestProfilingMiddleware",
+    "api.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -63,7 +66,8 @@ WSGI_APPLICATION = "foodgram.wsgi.application"
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": os.getenv(
+            "DB_ENGINE", "django.db.backends.postgresql"),
         "NAME": os.getenv("POSTGRES_DB", "django"),
         "USER": os.getenv("POSTGRES_USER", "django"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
@@ -72,6 +76,32 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: хосты PostgreSQL через запятую в DB_REPLICA_HOSTS
+# или имена баз в DB_REPLICA_NAMES (например, копии файла SQLite).
+DATABASE_REPLICAS = []
+for number, (key, value) in enumerate(
+    [("HOST", host) for host in os.getenv("DB_REPLICA_HOSTS", "").split(",")
+     if host]
+    + [("NAME", name) for name in os.getenv("DB_REPLICA_NAMES", "").split(",")
+       if name],
+    start=1,
+):
+    DATABASES[f"replica{number}"] = dict(
+        DATABASES["default"], **{key: value}, TEST={"MIRROR": "default"})
+    DATABASE_REPLICAS.append(f"replica{number}")
+
+DATABASE_ROUTERS = ["foodgram.db_routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+REPLICA_HEALTH_INTERVAL = int(os.getenv("REPLICA_HEALTH_INTERVAL", 5))
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -109,7 +139,7 @@ AUTH_USER_MODEL = "users.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
@@ -128,3 +158,14 @@ DJOSER = {
         "user_create": "api.serializers.CustomUserCreateSerializer",
     },
 }
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+SERVER_TIMING = bool(strtobool(os.getenv("SERVER_TIMING", "False")))
+METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/foodgram-metrics")
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv("AUTH_TOKEN_CACHE_TIMEOUT", 60))
+
+ASYNC_READS = bool(strtobool(os.getenv("ASYNC_READS", "False")))
+ASYNC_READ_WORKERS = int(os.getenv("ASYNC_READ_WORKERS", 8))
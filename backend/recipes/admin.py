@@ -1,7 +1,28 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
 from import_export.admin import ImportExportModelAdmin
 from recipes.models import (Favorite, Ingredient, IngredientRecipes, Recipe,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
+
+
+@contextmanager
+def shopping_list_sync(recipe_ids):
+    """
+    Переносит в списки покупок изменения ингредиентов рецептов,
+    сделанные внутри блока в обход сериализатора.
+    """
+    recipe_ids = set(recipe_ids)
+    before = {
+        recipe_id: ShoppingListItem.objects.recipe_amounts([recipe_id])
+        for recipe_id in recipe_ids
+    }
+    yield
+    for recipe_id, old in before.items():
+        deltas = ShoppingListItem.objects.recipe_amounts([recipe_id])
+        for ingredient_id, amount in old.items():
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        ShoppingListItem.objects.change_recipe(recipe_id, deltas)
 
 
 @admin.register(Tag)
@@ -29,6 +50,7 @@ class ReceptAdmin(admin.ModelAdmin):
     list_display = (
         "name",
         "author",
+        "favorites_count",
     )
     list_filter = ("author", "name", "tags")
     search_fields = ("name",)
@@ -45,6 +67,15 @@ class ReceptAdmin(admin.ModelAdmin):
         "tags",
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        with shopping_list_sync([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(Ingredient)
 class IngredientAdmin(ImportExportModelAdmin):
@@ -59,4 +90,21 @@ class IngredientAdmin(ImportExportModelAdmin):
 
 admin.site.register(Favorite)
 admin.site.register(ShoppingCart)
-admin.site.register(IngredientRecipes)
+
+
+@admin.register(IngredientRecipes)
+class IngredientRecipesAdmin(admin.ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        recipe_ids = [obj.recipe_id]
+        if change:
+            recipe_ids.append(form.initial["recipe"])
+        with shopping_list_sync(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with shopping_list_sync([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with shopping_list_sync(queryset.values_list("recipe_id", flat=True)):
+            super().delete_queryset(request, queryset)
@@ -0,0 +1,123 @@
+import io
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = "recipes/variants"
+VARIANT_SIZES = {
+    "small": 300,
+    "medium": 600,
+}
+VARIANT_FORMATS = {
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True,
+             "progressive": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+SOURCE_FORMATS = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+}
+
+IMAGE_WORKERS = getattr(settings, "IMAGE_WORKERS", 2)
+
+_executor = None
+
+
+def submit_image_task(func, *args):
+    """
+    Выполняет обработку изображения в фоновом пуле потоков.
+    При IMAGE_WORKERS = 0 обработка выполняется сразу.
+    """
+    global _executor
+    if IMAGE_WORKERS <= 0:
+        return func(*args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=IMAGE_WORKERS, thread_name_prefix="recipe-images")
+    return _executor.submit(_run_in_worker, func, *args)
+
+
+def _run_in_worker(func, *args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+def variant_name(image_name, size, fmt):
+    """Путь уменьшенной копии изображения в хранилище."""
+    stem = posixpath.splitext(posixpath.basename(image_name))[0]
+    extension = "jpg" if fmt == "jpeg" else fmt
+    return f"{VARIANTS_DIR}/{stem}_{VARIANT_SIZES[size]}.{extension}"
+
+
+def variant_names(image_name):
+    return [
+        variant_name(image_name, size, fmt)
+        for size in VARIANT_SIZES for fmt in VARIANT_FORMATS
+    ]
+
+
+def open_image(image_name, storage=default_storage):
+    """
+    Проверяет и загружает изображение из хранилища.
+    Ориентация из EXIF применяется к пикселям.
+    """
+    with storage.open(image_name, "rb") as source:
+        Image.open(source).verify()
+    with storage.open(image_name, "rb") as source:
+        image = Image.open(source)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def strip_metadata(image_name, image, storage=default_storage):
+    """
+    Сохраняет изображение без EXIF и прочих метаданных и возвращает
+    имя, под которым его записало хранилище. Исходный файл не удаляется:
+    до переключения рецепта на новое имя он продолжает отдаваться.
+    """
+    extension = posixpath.splitext(image_name)[1].lstrip(".").lower()
+    fmt = SOURCE_FORMATS.get(extension, image.format or "PNG")
+    if fmt == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return storage.save(image_name, ContentFile(buffer.getvalue()))
+
+
+def process_image(image_name, storage=default_storage):
+    """
+    Проверяет изображение, очищает метаданные и создает копии.
+    Возвращает имя очищенного изображения.
+    """
+    image = open_image(image_name, storage)
+    cleaned_name = strip_metadata(image_name, image, storage)
+    generate_variants(cleaned_name, storage, image)
+    return cleaned_name
+
+
+def generate_variants(image_name, storage=default_storage, image=None):
+    """
+    Создает уменьшенные копии изображения во всех размерах и форматах.
+    Существующие копии перезаписываются.
+    """
+    if image is None:
+        image = open_image(image_name, storage)
+    image = image.convert("RGB")
+    for size, side in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((side, side), Image.LANCZOS)
+        for fmt, options in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            name = variant_name(image_name, size, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
@@ -0,0 +1,92 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from recipes.models import (Favorite, IngredientRecipes, Recipe, ShoppingCart,
+                            ShoppingListItem)
+from recipes.sample_data import seed_sample_data
+from users.models import Subscription, User
+
+SQLITE_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)\b(?! USING)")
+POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def hot_queries(user, recipe):
+    """Запросы горячих путей API с параметрами из текущих данных."""
+    authors = Subscription.objects.filter(user=user).values("author")
+    return {
+        "лента рецептов": Recipe.objects.with_user_flags(user)[:6],
+        "рецепты автора": Recipe.objects.filter(author=recipe.author_id)[:6],
+        "последние рецепты подписок":
+            Recipe.objects.filter(author__in=authors).latest_by_author(3),
+        "избранное пользователя":
+            Recipe.objects.filter(Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef("pk"))))[:6],
+        "корзина пользователя": ShoppingCart.objects.filter(user=user),
+        "id подписок": Subscription.objects.filter(user=user).values_list(
+            "author_id", flat=True),
+        "подписки": User.objects.filter(following__user=user).order_by("id"),
+        "ингредиенты рецепта": IngredientRecipes.objects.filter(
+            recipe=recipe).values_list("ingredient_id", "amount"),
+        "покупатели рецепта": ShoppingCart.objects.filter(
+            recipe=recipe).values_list("user_id", flat=True),
+        "список покупок": ShoppingListItem.objects.filter(
+            user=user).select_related("ingredient"),
+        "необработанные изображения": Recipe.objects.exclude(
+            image_status=Recipe.IMAGE_READY).order_by().values_list("pk"),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Наполняет базу тестовыми данными внутри откатываемой транзакции, "
+        "выполняет EXPLAIN для горячих запросов и завершается ошибкой, "
+        "если в плане есть последовательное чтение таблицы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы целиком.",
+        )
+
+    def seq_scans(self, plan):
+        tables = set(connection.introspection.table_names())
+        if connection.vendor == "postgresql":
+            found = POSTGRES_SCAN.findall(plan)
+        else:
+            found = SQLITE_SCAN.findall(plan)
+        return sorted(set(found) & tables)
+
+    def handle(self, *args, **options):
+        failed = []
+        with transaction.atomic():
+            params = seed_sample_data()
+            user = params["viewer"]
+            recipe = Recipe.objects.filter(
+                shopping_cart__user=user).order_by("pk").first()
+            if connection.vendor == "postgresql":
+                # На маленьких таблицах планировщик выбирает Seq Scan
+                # и при наличии индекса; запрещаем его, чтобы в плане
+                # осталось только то, чего нельзя избежать.
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in hot_queries(user, recipe).items():
+                plan = queryset.explain()
+                scans = self.seq_scans(plan)
+                if options["verbose_plans"]:
+                    self.stdout.write(f"{name}:\n{plan}\n")
+                if scans:
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f"{name}: полное чтение {', '.join(scans)}"))
+                else:
+                    self.stdout.write(f"{name}: ok")
+            transaction.set_rollback(True)
+        if failed:
+            raise CommandError(
+                f"Полное чтение таблиц в {len(failed)} запросах.")
+        self.stdout.write(self.style.SUCCESS(
+            "Все запросы используют индексы."))
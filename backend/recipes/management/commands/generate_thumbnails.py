@@ -0,0 +1,66 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+from recipes.images import generate_variants, variant_names
+from recipes.models import Recipe, process_recipe_image
+
+IMAGES_DIR = "recipes"
+
+
+class Command(BaseCommand):
+    help = "Создает уменьшенные копии для изображений в media/recipes/."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Пересоздать уже существующие копии.",
+        )
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help=(
+                "Обработать изображения рецептов, оставшиеся в статусе "
+                "pending или failed (например, после перезапуска сервера)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["pending"]:
+            return self.process_pending()
+        _, files = default_storage.listdir(IMAGES_DIR)
+        created = skipped = failed = 0
+        for file_name in sorted(files):
+            image_name = posixpath.join(IMAGES_DIR, file_name)
+            if not options["force"] and all(
+                default_storage.exists(name)
+                for name in variant_names(image_name)
+            ):
+                skipped += 1
+                continue
+            try:
+                generate_variants(image_name)
+            except (OSError, UnidentifiedImageError) as error:
+                failed += 1
+                self.stderr.write(f"{image_name}: {error}")
+                continue
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: {created}, пропущено: {skipped}, ошибок: {failed}."
+        ))
+
+    def process_pending(self):
+        recipes = dict(
+            Recipe.objects.exclude(image_status=Recipe.IMAGE_READY)
+            .order_by().values_list("pk", "image")
+        )
+        for recipe_id, image_name in recipes.items():
+            process_recipe_image(recipe_id, image_name)
+        statuses = list(Recipe.objects.filter(pk__in=recipes).values_list(
+            "image_status", flat=True))
+        self.stdout.write(self.style.SUCCESS(
+            f"Обработано: {statuses.count(Recipe.IMAGE_READY)}, "
+            f"ошибок: {statuses.count(Recipe.IMAGE_FAILED)}."
+        ))
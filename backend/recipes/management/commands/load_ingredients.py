@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import time
+from functools import partial
+from pathlib import Path
+
+from api.cache import bump_version
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import MAX_LENGTH_10, MAX_LENGTH_200, Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR / "data" / "ingredients.csv"
+BATCH_SIZE = 5000
+
+
+class CSVStream(io.RawIOBase):
+    """Файловый объект для COPY: отдает строки CSV по мере чтения."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b""
+        self.line = io.StringIO()
+        self.writer = csv.writer(self.line, lineterminator="\n")
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while len(self.buffer) < len(target):
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            self.line.seek(0)
+            self.line.truncate()
+            self.writer.writerow(row)
+            self.buffer += self.line.getvalue().encode()
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает ингредиенты из CSV (название,единица) или JSON. "
+        "Уже существующие пары название/единица пропускаются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=str(DEFAULT_PATH),
+            help="Путь к ingredients.csv или ingredients.json.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Размер пачки bulk_create для баз кроме PostgreSQL.",
+        )
+
+    def read_rows(self, path):
+        if path.suffix == ".json":
+            with path.open(encoding="utf-8") as source:
+                for item in json.load(source):
+                    yield item["name"], item["measurement_unit"]
+        else:
+            with path.open(encoding="utf-8", newline="") as source:
+                for row in csv.reader(source):
+                    if len(row) >= 2:
+                        yield row[0], row[1]
+
+    def clean_rows(self, rows):
+        for name, measurement_unit in rows:
+            self.read += 1
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if (
+                not name or not measurement_unit
+                or len(name) > MAX_LENGTH_200
+                or len(measurement_unit) > MAX_LENGTH_10
+            ):
+                self.skipped += 1
+                continue
+            yield name, measurement_unit
+
+    def load_postgres(self, rows):
+        """COPY во временную таблицу и вставка недостающих пар."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE ingredient_staging "
+                "(name varchar(200), measurement_unit varchar(10)) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_staging (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                CSVStream(rows),
+            )
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT DISTINCT s.name, s.measurement_unit "
+                "FROM ingredient_staging s WHERE NOT EXISTS ("
+                f"SELECT 1 FROM {table} i WHERE i.name = s.name "
+                "AND i.measurement_unit = s.measurement_unit)"
+            )
+            return cursor.rowcount
+
+    def load_bulk(self, rows, batch_size):
+        seen = set(Ingredient.objects.values_list("name", "measurement_unit"))
+        created = 0
+        batch = []
+        for row in rows:
+            if row in seen:
+                continue
+            seen.add(row)
+            batch.append(Ingredient(name=row[0], measurement_unit=row[1]))
+            if len(batch) >= batch_size:
+                Ingredient.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
+        return created + len(batch)
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"Файл {path} не найден.")
+        self.read = self.skipped = 0
+        rows = self.clean_rows(self.read_rows(path))
+        started = time.monotonic()
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                created = self.load_postgres(rows)
+            else:
+                created = self.load_bulk(rows, options["batch_size"])
+            if created:
+                transaction.on_commit(partial(bump_version, "ingredient"))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано: {self.read}, добавлено: {created}, "
+            f"пропущено: {self.skipped} за {elapsed:.2f} с "
+            f"({self.read / max(elapsed, 1e-6):.0f} строк/с)."
+        ))
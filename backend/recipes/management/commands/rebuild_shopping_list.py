@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.transaction import atomic
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает таблицу списков покупок из корзин "
+        "или сверяет ее с живой агрегацией (--check)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только сверить таблицу, ничего не изменяя.",
+        )
+
+    def find_drift(self):
+        expected = {
+            (row["recipe__shopping_cart__user"], row["ingredient"]):
+                row["total"]
+            for row in ShoppingListItem.objects.live_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingListItem.objects.values_list(
+                "user_id", "ingredient_id", "amount").iterator()
+        }
+        return {
+            key: (stored.get(key), expected.get(key))
+            for key in expected.keys() | stored.keys()
+            if stored.get(key) != expected.get(key)
+        }
+
+    def handle(self, *args, **options):
+        if not options["check"]:
+            with atomic():
+                ShoppingListItem.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                "Списки покупок пересобраны: "
+                f"{ShoppingListItem.objects.count()} строк."
+            ))
+            return
+        drift = self.find_drift()
+        for (user_id, ingredient_id), (stored, expected) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"в таблице {stored}, ожидается {expected}"
+            )
+        if drift:
+            raise CommandError(f"Расхождений: {len(drift)}.")
+        self.stdout.write(self.style.SUCCESS("Расхождений нет."))
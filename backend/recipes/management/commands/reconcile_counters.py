@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.transaction import atomic
+from recipes.models import Favorite, Recipe
+from users.models import User
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+)
+
+
+def actual_count(related_model, field):
+    """Подзапрос с реальным числом связанных строк."""
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef("pk")})
+        .order_by().values(field)
+        .annotate(total=Count("pk")).values("total")
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет счетчики favorites_count и recipes_count с данными "
+        "и исправляет расхождения."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только показать расхождения, ничего не изменяя.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, counter, related_model, field in COUNTERS:
+            drift = list(
+                model.objects.annotate(
+                    actual=actual_count(related_model, field))
+                .exclude(**{counter: F("actual")})
+                .values_list("pk", counter, "actual")
+            )
+            for pk, stored, actual in drift:
+                self.stdout.write(
+                    f"{model._meta.model_name}={pk} {counter}: "
+                    f"в таблице {stored}, на самом деле {actual}"
+                )
+            if drift and not options["check"]:
+                with atomic():
+                    model.objects.filter(
+                        pk__in=[pk for pk, _, _ in drift]
+                    ).update(**{counter: actual_count(related_model, field)})
+            total += len(drift)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет."))
+        elif options["check"]:
+            raise CommandError(f"Расхождений: {total}.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Исправлено расхождений: {total}."))
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:38
+
+from django.db import migrations
+
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipe_name_trgm_idx '
+    'ON recipes_recipe USING gin (name gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS recipe_search_idx "
+    "ON recipes_recipe USING gin (to_tsvector('russian'::regconfig, "
+    "COALESCE(name, '') || ' ' || COALESCE(text, '')))",
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipe_name_trgm_idx',
+    'DROP INDEX IF EXISTS recipe_search_idx',
+)
+
+
+def run_on_postgres(statements):
+    """
+    pg_trgm и GIN-индексы есть только в PostgreSQL.
+    Индексы не объявлены в Meta.indexes,
+    чтобы SQLite не пытался создать их при пересборке таблицы.
+    """
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgres(CREATE_INDEXES), run_on_postgres(DROP_INDEXES)),
+    ]
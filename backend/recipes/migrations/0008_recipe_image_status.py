@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'обрабатывается'), ('ready', 'готово'), ('failed', 'ошибка')], default='ready', max_length=10, verbose_name='статус изображения'),
+        ),
+    ]
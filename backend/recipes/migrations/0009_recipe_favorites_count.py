@@ -0,0 +1,32 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:50
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_favorites_count(apps, schema_editor):
+    Favorite = apps.get_model("recipes", "Favorite")
+    Recipe = apps.get_model("recipes", "Recipe")
+    counts = (
+        Favorite.objects.filter(recipe=models.OuterRef("pk"))
+        .order_by().values("recipe")
+        .annotate(total=models.Count("pk")).values("total")
+    )
+    Recipe.objects.update(
+        favorites_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.RunPython(fill_favorites_count, migrations.RunPython.noop),
+    ]
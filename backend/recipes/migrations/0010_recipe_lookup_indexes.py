@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ('user_id', 'recipe_id'), 'verbose_name': 'Рецепт пользователя для списка покупок', 'verbose_name_plural': 'Рецепты пользователей для списка покупок'},
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('image_status', 'ready'), _negated=True), fields=['id'], name='recipe_image_unready_idx'),
+        ),
+    ]
@@ -1,12 +1,48 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 from django.core.validators import MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import connections, models, transaction
+from django.db.models import (Case, Exists, F, OuterRef, Q, Subquery, Sum,
+                              Value, When, Window)
+from django.db.models.functions import Greatest, RowNumber
+from recipes.images import process_image, submit_image_task, variant_names
+from users.models import CounterFieldsMixin, User
 
 MAX_LENGTH_200 = 200
 MAX_LENGTH_10 = 10
 MAX_LENGTH_7 = 7
 LIMIT_VALUE = 1
+SEARCH_CONFIG = "russian"
+
+logger = logging.getLogger(__name__)
+
+# Строки меняет массовая операция, которая сама обновляет зависимые
+# данные; обработчики сигналов отдельных строк их пропускают.
+in_bulk_change = ContextVar("in_bulk_change", default=False)
+
+
+@contextmanager
+def bulk_change():
+    token = in_bulk_change.set(True)
+    try:
+        yield
+    finally:
+        in_bulk_change.reset(token)
+
+
+def recipe_search_vector():
+    """
+    Полнотекстовый вектор рецепта.
+    Совпадает с выражением индекса recipe_search_idx (миграция 0005).
+    """
+    return SearchVector("name", "text", config=SEARCH_CONFIG)
 
 
 class Tag(models.Model):
@@ -44,7 +80,94 @@ class Ingredient(models.Model):
         return str(self.name)
 
 
-class Recipe(models.Model):
+class TopRows(Subquery):
+    """
+    Id строк подзапроса с row_number не больше limit.
+    SQL строится при компиляции внешнего запроса для той базы,
+    в которой он выполняется.
+    """
+
+    template = (
+        "(SELECT ranked.id FROM (%(subquery)s) ranked "
+        "WHERE ranked.row_number <= %%s)"
+    )
+
+    def __init__(self, queryset, limit, **extra):
+        super().__init__(queryset, **extra)
+        self.limit = limit
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*params, self.limit)
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Выборка рецептов с пользовательскими отметками."""
+
+    def with_user_flags(self, user):
+        """
+        Аннотирует is_favorited и is_in_shopping_cart
+        коррелированными подзапросами Exists.
+        """
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef("pk"))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef("pk"))),
+        )
+
+    def search(self, query):
+        """
+        Поиск по названию и описанию с сортировкой по релевантности.
+        На PostgreSQL используются GIN-индексы tsvector и pg_trgm,
+        на остальных базах - поиск по вхождению подстроки.
+        """
+        if connections[self.db].vendor == "postgresql":
+            search_query = SearchQuery(
+                query, config=SEARCH_CONFIG, search_type="websearch")
+            return self.annotate(
+                search=recipe_search_vector(),
+                rank=(
+                    SearchRank(recipe_search_vector(), search_query)
+                    + TrigramSimilarity("name", query)
+                ),
+            ).filter(
+                Q(search=search_query) | Q(name__trigram_similar=query)
+            ).order_by("-rank", "-pub_date")
+        return self.filter(
+            Q(name__icontains=query) | Q(text__icontains=query)
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(3)),
+                When(name__icontains=query, then=Value(2)),
+                default=Value(1),
+                output_field=models.IntegerField(),
+            )
+        ).order_by("-rank", "-pub_date")
+
+    def latest_by_author(self, limit):
+        """
+        Оставляет не более limit последних рецептов каждого автора.
+        Нумерация строк считается одним запросом с ROW_NUMBER().
+        """
+        ranked = self.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F("author_id")],
+                order_by=[F("pub_date").desc(), F("id").desc()],
+            )
+        ).order_by().values("id", "row_number")
+        return self.model.objects.filter(pk__in=TopRows(ranked, limit))
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель Рецепта."""
 
     tags = models.ManyToManyField(Tag,
@@ -62,10 +185,25 @@ class Recipe(models.Model):
         verbose_name="Ингридиенты",
         through="IngredientRecipes")
     name = models.CharField("Название", max_length=MAX_LENGTH_200)
+    IMAGE_PENDING = "pending"
+    IMAGE_READY = "ready"
+    IMAGE_FAILED = "failed"
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, "обрабатывается"),
+        (IMAGE_READY, "готово"),
+        (IMAGE_FAILED, "ошибка"),
+    )
+
     image = models.ImageField(
         verbose_name="изображение",
         upload_to="recipes/",
     )
+    image_status = models.CharField(
+        "статус изображения",
+        max_length=MAX_LENGTH_10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+    )
     text = models.TextField(verbose_name="описание")
     cooking_time = models.PositiveIntegerField(
         verbose_name="время приготовления, в мин",
@@ -80,17 +218,82 @@ class Recipe(models.Model):
         "Дата рецепта",
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        "Дата изменения",
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        "В избранном",
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ("favorites_count",)
 
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = (
+            models.Index(
+                fields=["-pub_date", "-id"], name="recipe_pub_date_id_idx"),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=~Q(image_status="ready"),
+                name="recipe_image_unready_idx",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.name}. Автор: {self.author.username}"
 
     def save(self, *args, **kwargs) -> None:
-        super().save(*args, **kwargs)
+        image_uploaded = bool(self.image) and not self.image._committed
+        if image_uploaded:
+            self.image_status = self.IMAGE_PENDING
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        if image_uploaded:
+            transaction.on_commit(partial(
+                submit_image_task,
+                process_recipe_image, self.pk, self.image.name,
+            ))
+
+
+def process_recipe_image(recipe_id, image_name):
+    """
+    Фоновая обработка загруженного изображения рецепта.
+    По завершении рецепт получает статус ready или failed и переключается
+    на очищенную копию, после чего исходный файл удаляется.
+    """
+    cleaned_name = image_name
+    try:
+        cleaned_name = process_image(image_name)
+    except Exception:
+        logger.exception("Не удалось обработать %s", image_name)
+        status = Recipe.IMAGE_FAILED
+    else:
+        status = Recipe.IMAGE_READY
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id, image=image_name).first()
+        if recipe is not None:
+            recipe.image.name = cleaned_name
+            recipe.image_status = status
+            recipe.save(update_fields=("image", "image_status", "updated_at"))
+    if cleaned_name == image_name:
+        return
+    # Удаляется файл, на который рецепт больше не ссылается: исходный,
+    # либо копия, если изображение рецепта за это время заменили.
+    stale_name = image_name if recipe is not None else cleaned_name
+    for name in [stale_name] + variant_names(stale_name):
+        default_storage.delete(name)
 
 
 class IngredientRecipes(models.Model):
@@ -129,6 +332,71 @@ class IngredientRecipes(models.Model):
         )
 
 
+class UserRecipeManager(models.Manager):
+    """
+    Массовое добавление и удаление рецептов пользователя.
+
+    Один INSERT и один DELETE, обработчики сигналов строк не работают,
+    поэтому зависимые данные обновляются в recipes_added и
+    recipes_removed. Строка пользователя блокируется здесь и в save()
+    и delete() моделей, чтобы параллельные запросы одного пользователя
+    не учли рецепт дважды.
+    """
+
+    def lock_user(self, user_id):
+        list(User.objects.select_for_update().filter(pk=user_id).values("pk"))
+
+    def bulk_add(self, user_id, recipe_ids):
+        """Добавляет рецепты и возвращает id тех, которых еще не было."""
+        with transaction.atomic():
+            self.lock_user(user_id)
+            existing = set(self.filter(
+                user_id=user_id, recipe_id__in=recipe_ids,
+            ).values_list("recipe_id", flat=True))
+            added = [pk for pk in recipe_ids if pk not in existing]
+            self.bulk_create(
+                [self.model(user_id=user_id, recipe_id=pk) for pk in added],
+                ignore_conflicts=True,
+            )
+            self.recipes_added(user_id, added)
+        return added
+
+    def bulk_remove(self, user_id, recipe_ids):
+        """Удаляет рецепты и возвращает id тех, что были добавлены."""
+        with transaction.atomic():
+            self.lock_user(user_id)
+            rows = self.filter(user_id=user_id, recipe_id__in=recipe_ids)
+            removed = list(rows.values_list("recipe_id", flat=True))
+            self.recipes_removed(user_id, removed)
+            with bulk_change():
+                rows.delete()
+        return removed
+
+    def recipes_added(self, user_id, recipe_ids):
+        pass
+
+    def recipes_removed(self, user_id, recipe_ids):
+        pass
+
+
+class FavoriteManager(UserRecipeManager):
+    def recipes_added(self, user_id, recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=F("favorites_count") + 1)
+
+    def recipes_removed(self, user_id, recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).update(
+            favorites_count=F("favorites_count") - 1)
+
+
+class ShoppingCartManager(UserRecipeManager):
+    def recipes_added(self, user_id, recipe_ids):
+        ShoppingListItem.objects.add_recipes(user_id, recipe_ids)
+
+    def recipes_removed(self, user_id, recipe_ids):
+        ShoppingListItem.objects.remove_recipes(user_id, recipe_ids)
+
+
 class Favorite(models.Model):
     """Модель для избранных рецептов."""
 
@@ -145,6 +413,8 @@ class Favorite(models.Model):
         verbose_name="Рецепт",
     )
 
+    objects = FavoriteManager()
+
     class Meta:
         verbose_name = "Избранное"
         verbose_name_plural = "Избранное"
@@ -158,6 +428,16 @@ class Favorite(models.Model):
     def __str__(self):
         return f"{self.user} добавил в избранное {self.recipe}!"
 
+    def save(self, *args, **kwargs) -> None:
+        with transaction.atomic():
+            Favorite.objects.lock_user(self.user_id)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Favorite.objects.lock_user(self.user_id)
+            return super().delete(*args, **kwargs)
+
 
 class ShoppingCart(models.Model):
     """Класс составления списка покупок."""
@@ -175,10 +455,12 @@ class ShoppingCart(models.Model):
         verbose_name="Пользователь",
     )
 
+    objects = ShoppingCartManager()
+
     class Meta:
         verbose_name = "Рецепт пользователя для списка покупок"
         verbose_name_plural = "Рецепты пользователей для списка покупок"
-        ordering = ("user",)
+        ordering = ("user_id", "recipe_id")
         constraints = (
             models.UniqueConstraint(
                 fields=["user", "recipe"], name="unique_shopping_cart"
@@ -187,3 +469,144 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.recipe} в списке покупок у {self.user}"
+
+    def save(self, *args, **kwargs) -> None:
+        # Суммы списка покупок меняются в post_save в той же транзакции;
+        # блокировка пользователя не дает параллельным изменениям его
+        # корзины разойтись с суммами.
+        with transaction.atomic():
+            ShoppingCart.objects.lock_user(self.user_id)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            ShoppingCart.objects.lock_user(self.user_id)
+            return super().delete(*args, **kwargs)
+
+
+class ShoppingListManager(models.Manager):
+    """Поддержка агрегированного списка покупок в актуальном состоянии."""
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+        Изменяет суммы ингредиентов пользователей на deltas
+        ({id ингредиента: изменение}) и удаляет обнулившиеся строки.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        user_ids = list(user_ids)
+        if not user_ids or not deltas:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, delta in deltas.items() if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        items.update(amount=Greatest(
+            F("amount") + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+            Value(0),
+        ))
+        items.filter(amount=0).delete()
+
+    def recipe_amounts(self, recipe_ids, sign=1):
+        """Суммы ингредиентов рецептов одним запросом."""
+        totals = (
+            IngredientRecipes.objects.filter(recipe_id__in=recipe_ids)
+            .values("ingredient_id")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+        return {
+            row["ingredient_id"]: sign * row["total"] for row in totals
+        }
+
+    def add_recipe(self, user_id, recipe_id):
+        self.add_recipes(user_id, [recipe_id])
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.remove_recipes(user_id, [recipe_id])
+
+    def add_recipes(self, user_id, recipe_ids):
+        if recipe_ids:
+            self.apply_deltas([user_id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        if recipe_ids:
+            self.apply_deltas(
+                [user_id], self.recipe_amounts(recipe_ids, sign=-1))
+
+    def change_recipe(self, recipe, deltas):
+        """Учитывает изменение ингредиентов рецепта у всех покупателей."""
+        user_ids = ShoppingCart.objects.filter(recipe=recipe).values_list(
+            "user_id", flat=True)
+        self.apply_deltas(user_ids, deltas)
+
+    def live_totals(self):
+        """Суммы ингредиентов, посчитанные по корзинам напрямую."""
+        return (
+            IngredientRecipes.objects.filter(
+                recipe__shopping_cart__isnull=False)
+            .values("recipe__shopping_cart__user", "ingredient")
+            .annotate(total=Sum("amount"))
+            .order_by()
+        )
+
+    def rebuild(self):
+        self.all().delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=row["recipe__shopping_cart__user"],
+                    ingredient_id=row["ingredient"],
+                    amount=row["total"],
+                )
+                for row in self.live_totals().iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="shopping_list",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество", default=0)
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        verbose_name = "Ингредиент в списке покупок"
+        verbose_name_plural = "Ингредиенты в списках покупок"
+        ordering = ("user", "ingredient")
+        constraints = (
+            models.UniqueConstraint(
+                fields=["user", "ingredient"], name="unique_shopping_list"
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.user}: {self.ingredient}, {self.amount}"
@@ -0,0 +1,74 @@
+"""
+Тестовые данные для проверок запросов: пользователи с рецептами,
+подписками, избранным и корзиной. Вызывается внутри транзакции,
+которая затем откатывается.
+"""
+from recipes.models import (Favorite, Ingredient, IngredientRecipes, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+USERS = 12
+TAGS = 8
+INGREDIENTS = 60
+RECIPES_PER_AUTHOR = 5
+TAGS_PER_RECIPE = 4
+INGREDIENTS_PER_RECIPE = 8
+
+
+def seed_sample_data():
+    """Создает данные и возвращает зрителя и id объектов для запросов."""
+    User.objects.bulk_create(
+        User(
+            username=f"sample{i}",
+            email=f"sample{i}@example.com",
+            first_name="Имя",
+            last_name="Фамилия",
+        )
+        for i in range(USERS)
+    )
+    users = list(User.objects.filter(username__startswith="sample"))
+    Tag.objects.bulk_create(
+        Tag(name=f"Тэг {i}", color=f"#0000{i:02d}", slug=f"sample-{i}")
+        for i in range(TAGS)
+    )
+    tags = list(Tag.objects.filter(slug__startswith="sample-"))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f"ингредиент {i}", measurement_unit="г")
+        for i in range(INGREDIENTS)
+    )
+    ingredients = list(
+        Ingredient.objects.filter(name__startswith="ингредиент "))
+    for author in users[1:]:
+        for number in range(RECIPES_PER_AUTHOR):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f"Рецепт {author.pk}-{number}",
+                image="recipes/sample.png",
+                text="Описание",
+                cooking_time=10,
+            )
+            offset = recipe.pk % TAGS
+            recipe.tags.set(
+                (tags * 2)[offset:offset + TAGS_PER_RECIPE])
+            IngredientRecipes.objects.bulk_create(
+                IngredientRecipes(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1)
+                for i, ingredient in enumerate(
+                    ingredients[offset:offset + INGREDIENTS_PER_RECIPE])
+            )
+    viewer = users[0]
+    recipes = list(Recipe.objects.filter(author__in=users[1:]))
+    for author in users[1:]:
+        Subscription.objects.create(user=viewer, author=author)
+    for recipe in recipes[::2]:
+        Favorite.objects.create(user=viewer, recipe=recipe)
+    for recipe in recipes[::3]:
+        ShoppingCart.objects.create(user=viewer, recipe=recipe)
+    return {
+        "viewer": viewer,
+        "recipe": recipes[0].pk,
+        "author": users[1].pk,
+        "tag": tags[0].pk,
+        "tag_slug": tags[0].slug,
+        "ingredient": ingredients[0].pk,
+    }
@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from recipes.models import (Ingredient, IngredientRecipes, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from users.models import User
+
+
+class QueryPlanTest(TestCase):
+    """Горячие запросы на тестовых данных читают таблицы по индексам."""
+
+    def test_hot_queries_use_indexes(self):
+        output = StringIO()
+        try:
+            call_command("check_query_plans", stdout=output)
+        except CommandError as error:
+            self.fail(f"{error}\n{output.getvalue()}")
+
+
+class RebuildShoppingListTest(TestCase):
+    """rebuild_shopping_list находит и исправляет расхождения сумм."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="x")
+        recipe = Recipe.objects.create(
+            author=cls.user, name="Блины", text="Описание", cooking_time=10,
+            image="recipes/test.png",
+        )
+        cls.flour = Ingredient.objects.create(
+            name="мука", measurement_unit="г")
+        IngredientRecipes.objects.create(
+            recipe=recipe, ingredient=cls.flour, amount=100)
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def check(self):
+        call_command("rebuild_shopping_list", "--check", stdout=StringIO())
+
+    def test_check_passes_for_incremental_totals(self):
+        self.check()
+
+    def test_rebuild_fixes_drift(self):
+        ShoppingListItem.objects.filter(user=self.user).update(amount=1)
+        with self.assertRaisesMessage(CommandError, "Расхождений: 1."):
+            self.check()
+        call_command("rebuild_shopping_list", stdout=StringIO())
+        self.check()
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.user, ingredient=self.flour).amount,
+            100,
+        )
@@ -4,7 +4,8 @@ from users.models import Subscription, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ("id", "first_name", "last_name", "email")
+    list_display = (
+        "id", "first_name", "last_name", "email", "recipes_count")
     search_fields = ("first_name",)
     list_filter = ("email", "first_name")
 
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:50
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_recipes_count(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    User = apps.get_model("users", "User")
+    counts = (
+        Recipe.objects.filter(author=models.OuterRef("pk"))
+        .order_by().values("author")
+        .annotate(total=models.Count("pk")).values("total")
+    )
+    User.objects.update(recipes_count=Coalesce(models.Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+        ('users', '0002_auto_20231011_2221'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='user',
+            options={'ordering': ('id',), 'verbose_name': 'Пользователь'},
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_recipes_count, migrations.RunPython.noop),
+    ]
@@ -6,7 +6,31 @@ MAX_LENGTH_150 = 150
 MAX_LENGTH_254 = 254
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Счетчики counter_fields меняются только через F() в сигналах.
+    Полное сохранение существующей строки их не пишет, иначе экземпляр,
+    загруженный раньше, вернул бы в базу старое значение.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+            and not args
+        ):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Модель юзера."""
 
     username = models.CharField(
@@ -41,6 +65,13 @@ class User(AbstractUser):
         verbose_name="Подписка на автора",
         help_text="Отметка о подписке на автора",
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+
+    counter_fields = ("recipes_count",)
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -72,6 +103,10 @@ class Subscription(models.Model):
             models.UniqueConstraint(fields=["author", "user"],
                                     name="unique_follower")
         ]
+        indexes = [
+            models.Index(fields=["user", "author"],
+                         name="subscription_user_author_idx")
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на: {self.author}'